@@ -0,0 +1,455 @@
+"""
+Expectimax search for choosing moves, over bitboards (see bitboard.py).
+
+Max nodes pick the best of the four moves, chance nodes average over every
+possible spawn (a 2 with P = 0.75 or a 4 with P = 0.25 in each empty cell,
+matching GameEngine.add_two). Leaves are scored with a precomputed per-row
+heuristic. The search deepens iteratively until its time budget runs out.
+
+ParallelExpectimaxAI searches each root move in its own worker process.
+Both players return a Future from submit(), so the GUI can poll for the
+move with after() instead of blocking the Tk thread.
+"""
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import bitboard
+from game_engine import DIRECTIONS
+
+
+# Spawn probabilities, as in GameEngine.add_two
+SPAWN_PROBABILITIES = ((1, 0.75), (2, 0.25))
+
+# Heuristic weights for a single row (or column)
+LOST_PENALTY = 200000.0
+MONOTONICITY_POWER = 4.0
+MONOTONICITY_WEIGHT = 47.0
+SUM_POWER = 3.5
+SUM_WEIGHT = 11.0
+MERGES_WEIGHT = 700.0
+EMPTY_WEIGHT = 270.0
+
+_heuristic_table = None
+
+
+def _row_heuristic(row):
+    """Scores a single 16-bit row: empties, merges and monotonicity"""
+    line = [(row >> (4 * j)) & 0xF for j in range(4)]
+
+    total = 0.0
+    empty = 0
+    merges = 0
+    previous = 0
+    counter = 0
+    for rank in line:
+        total += rank ** SUM_POWER
+        if rank == 0:
+            empty += 1
+        else:
+            if previous == rank:
+                counter += 1
+            elif counter > 0:
+                merges += 1 + counter
+                counter = 0
+            previous = rank
+    if counter > 0:
+        merges += 1 + counter
+
+    # Penalise rows which are neither increasing or decreasing
+    monotonicity_left = 0.0
+    monotonicity_right = 0.0
+    for j in range(1, 4):
+        if line[j - 1] > line[j]:
+            monotonicity_left += line[j - 1] ** MONOTONICITY_POWER - \
+                line[j] ** MONOTONICITY_POWER
+        else:
+            monotonicity_right += line[j] ** MONOTONICITY_POWER - \
+                line[j - 1] ** MONOTONICITY_POWER
+
+    return LOST_PENALTY + EMPTY_WEIGHT * empty + MERGES_WEIGHT * merges - \
+        MONOTONICITY_WEIGHT * min(monotonicity_left, monotonicity_right) - \
+        SUM_WEIGHT * total
+
+
+def heuristic_table():
+    """Returns the 65,536 entry row heuristic table, building it once"""
+    global _heuristic_table
+    if _heuristic_table is None:
+        _heuristic_table = [
+            _row_heuristic(row) for row in range(bitboard.ROW_MASK + 1)
+        ]
+
+    return _heuristic_table
+
+
+class TranspositionTable:
+    """
+    Bounded cache of chance node values, kept between searches
+
+    Entries are keyed by one integer packing the bitboard and the remaining
+    depth (which must be below 16). Once max_bytes worth of
+    entries are stored, the least recently used entry is evicted, and
+    entries not used in the last max_age searches are dropped as stale.
+    """
+
+    # Rough size of one entry: the dict slot, key, value tuple and float
+    ENTRY_BYTES = 250
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_age=8):
+        self.max_entries = max(1, max_bytes // self.ENTRY_BYTES)
+        self.max_age = max_age
+
+        # key -> (value, generation of the search which last used it)
+        self.entries = OrderedDict()
+        self.generation = 0
+
+        # Counters exposed through stats()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def new_search(self):
+        """Starts a new search generation, dropping stale entries"""
+        self.generation += 1
+
+        # Entries are kept in least recently used order, so the stale
+        # entries are all at the front
+        oldest = self.generation - self.max_age
+        while self.entries:
+            key, (value, generation) = next(iter(self.entries.items()))
+            if generation >= oldest:
+                break
+            del self.entries[key]
+            self.evictions += 1
+
+    def get(self, board, depth):
+        """Returns the stored value, or None if it is not in the table"""
+        key = (board << 4) | depth
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        # Mark the entry as used by this search
+        self.entries[key] = (entry[0], self.generation)
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, board, depth, value):
+        """Stores a value, evicting the least recently used when full"""
+        key = (board << 4) | depth
+        self.entries[key] = (value, self.generation)
+        self.entries.move_to_end(key)
+
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Removes every entry, keeping the counters"""
+        self.entries.clear()
+
+    def stats(self):
+        """
+        Returns the size of the table and its hit / miss / eviction counts
+        """
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+class _SearchTimeout(Exception):
+    """Raised inside the search when the time budget is used up"""
+
+
+class ExpectimaxAI:
+    """
+    Depth-limited expectimax player
+
+    time_limit:         seconds allowed per move
+    max_depth:          deepest number of moves searched ahead
+    probability_cutoff: chance branches less likely than this are not
+                        expanded, and are scored with the heuristic
+    table:              TranspositionTable to use, e.g. a larger one for
+                        long autoplay sessions
+    """
+
+    def __init__(self, time_limit=0.04, max_depth=3,
+                 probability_cutoff=0.0001, table=None):
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.probability_cutoff = probability_cutoff
+
+        self.heuristic = heuristic_table()
+
+        # Chance node values, reused between moves
+        if table is None:
+            table = TranspositionTable()
+        self.table = table
+
+        # Deepest search completed by the last call to best_move
+        self.last_depth = 0
+
+    def best_move(self, board):
+        """
+        Returns the best direction (see DIRECTIONS) for the given bitboard,
+        or None if no move changes the board
+        """
+        deadline = time.perf_counter() + self.time_limit
+        self.table.new_search()
+        self.last_depth = 0
+
+        # Fall back on the first legal move if even depth 1 runs out of time
+        mask = bitboard.legal_moves(board)
+        legal = [index for index in range(4) if mask >> index & 1]
+        if not legal:
+            return None
+        best = legal[0]
+
+        # Iterative deepening - keep the result of the deepest full search
+        for depth in range(1, self.max_depth + 1):
+            try:
+                best = self._search_root(board, legal, depth, deadline)
+            except _SearchTimeout:
+                break
+
+            self.last_depth = depth
+            if time.perf_counter() >= deadline:
+                break
+
+        return DIRECTIONS[best]
+
+    def submit(self, board):
+        """
+        Searches for the best move straight away, returning a finished
+        Future so it can be used in place of ParallelExpectimaxAI
+        """
+        future = Future()
+        future.set_result(self.best_move(board))
+        return future
+
+    def evaluate(self, board):
+        """Heuristic value of a board: the score of every row and column"""
+        heuristic = self.heuristic
+        transposed = bitboard.transpose(board)
+        return heuristic[board & 0xFFFF] + \
+            heuristic[(board >> 16) & 0xFFFF] + \
+            heuristic[(board >> 32) & 0xFFFF] + \
+            heuristic[board >> 48] + \
+            heuristic[transposed & 0xFFFF] + \
+            heuristic[(transposed >> 16) & 0xFFFF] + \
+            heuristic[(transposed >> 32) & 0xFFFF] + \
+            heuristic[transposed >> 48]
+
+    def _search_root(self, board, legal, depth, deadline):
+        """Returns the index of the best move, searching depth moves ahead"""
+        best_index = legal[0]
+        best_value = -1.0
+        for index in legal:
+            new_board = bitboard.MOVES[index](board)[0]
+            value = self.value_after_move(new_board, depth, deadline)
+            if value > best_value:
+                best_value = value
+                best_index = index
+
+        return best_index
+
+    def value_after_move(self, board, depth, deadline):
+        """
+        Expected value of a board straight after a move, searching
+        depth moves ahead in total (including the move already played)
+        """
+        return self._chance_node(board, depth - 1, 1.0, deadline)
+
+    def _max_node(self, board, depth, probability, deadline):
+        """Value of the best move from this board (0 if the game is lost)"""
+        if time.perf_counter() >= deadline:
+            raise _SearchTimeout()
+
+        # Only search the moves which change the board
+        legal = bitboard.legal_moves(board)
+        best_value = 0.0
+        for index in range(4):
+            if not legal >> index & 1:
+                continue
+
+            new_board = bitboard.MOVES[index](board)[0]
+            value = self._chance_node(new_board, depth - 1, probability,
+                                      deadline)
+            if value > best_value:
+                best_value = value
+
+        return best_value
+
+    def _chance_node(self, board, depth, probability, deadline):
+        """
+        Expected value over every tile that can spawn on this board,
+        with depth moves left to search after the spawn
+        """
+        if depth <= 0 or probability < self.probability_cutoff:
+            return self.evaluate(board)
+
+        value = self.table.get(board, depth)
+        if value is not None:
+            return value
+
+        empty = bitboard.empty_cells(board)
+        if not empty:
+            return self.evaluate(board)
+
+        total = 0.0
+        for index in empty:
+            shift = 4 * index
+            for exponent, spawn_probability in SPAWN_PROBABILITIES:
+                child_probability = probability * spawn_probability / \
+                    len(empty)
+                total += spawn_probability * self._max_node(
+                    board | (exponent << shift), depth,
+                    child_probability, deadline)
+
+        value = total / len(empty)
+        self.table.put(board, depth, value)
+        return value
+
+
+# The search used by each worker process of ParallelExpectimaxAI
+_worker_ai = None
+
+
+def _init_worker(max_depth, probability_cutoff):
+    """Builds the worker's search (and its tables) once per process"""
+    global _worker_ai
+    bitboard.load_tables()
+    _worker_ai = ExpectimaxAI(
+        max_depth=max_depth,
+        probability_cutoff=probability_cutoff)
+
+
+def _search_move(board, index, deadline):
+    """
+    Runs in a worker process: plays move index on board, then deepens the
+    search until the shared deadline (a time.time() value).
+
+    Returns (index, values), where values[d - 1] is the value at depth d
+    """
+    ai = _worker_ai
+    ai.table.new_search()
+    new_board = bitboard.MOVES[index](board)[0]
+
+    # time.time() is shared between processes, perf_counter() may not be
+    local_deadline = time.perf_counter() + (deadline - time.time())
+
+    # Depth 1 is a single evaluation, so it always completes
+    values = [ai.value_after_move(new_board, 1, local_deadline)]
+    for depth in range(2, ai.max_depth + 1):
+        try:
+            values.append(
+                ai.value_after_move(new_board, depth, local_deadline))
+        except _SearchTimeout:
+            break
+
+    return index, values
+
+
+class ParallelExpectimaxAI:
+    """
+    Root-parallel expectimax player
+
+    Each legal move is searched in its own worker process, with one deadline
+    shared by all of them. The moves are compared at the deepest depth that
+    every worker completed.
+
+    time_limit:         seconds allowed per move
+    max_depth:          deepest number of moves searched ahead
+    probability_cutoff: as in ExpectimaxAI
+    processes:          number of worker processes (one per move is ideal)
+    """
+
+    def __init__(self, time_limit=0.04, max_depth=4,
+                 probability_cutoff=0.0001, processes=4):
+        self.time_limit = time_limit
+        # Workers are spawned, not forked: forking a process which runs
+        # Tk (and other threads) can leave the child holding their locks
+        self.executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(max_depth, probability_cutoff))
+
+        # Deepest search used by the last finished move
+        self.last_depth = 0
+
+    def submit(self, board):
+        """
+        Starts searching the given bitboard in the worker processes.
+
+        Returns a Future for the best direction (or None if no move
+        changes the board), without waiting for the search
+        """
+        result = Future()
+        deadline = time.time() + self.time_limit
+
+        mask = bitboard.legal_moves(board)
+        legal = [index for index in range(4) if mask >> index & 1]
+        if not legal:
+            result.set_result(None)
+            return result
+
+        futures = [
+            self.executor.submit(_search_move, board, index, deadline)
+            for index in legal
+        ]
+
+        # Resolve the result once the last worker has finished
+        lock = threading.Lock()
+        remaining = [len(futures)]
+
+        def worker_finished(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+
+            try:
+                result.set_result(self._pick_move(
+                    [future.result() for future in futures]))
+            except Exception as e:
+                result.set_exception(e)
+
+        for future in futures:
+            future.add_done_callback(worker_finished)
+
+        return result
+
+    def best_move(self, board):
+        """Searches the given bitboard, waiting for the best direction"""
+        return self.submit(board).result()
+
+    def _pick_move(self, searches):
+        """Given (index, values) from every worker, returns the best move"""
+        depth = min(len(values) for index, values in searches)
+        self.last_depth = depth
+
+        best_index, best_values = max(
+            searches, key=lambda search: search[1][depth - 1])
+        return DIRECTIONS[best_index]
+
+    def shutdown(self):
+        """
+        Stops the worker processes, abandoning any queued search.
+        Running searches end at their deadline, so this returns quickly
+        """
+        self.executor.shutdown(wait=True, cancel_futures=True)
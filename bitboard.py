@@ -0,0 +1,215 @@
+"""
+A packed 64-bit representation of the 2048 board.
+
+Each of the 16 cells is stored as a 4-bit exponent (0 = empty, 1 = 2,
+2 = 4 ... 15 = 32768), row by row, so cell (i, j) lives in the nibble
+starting at bit 16 * i + 4 * j.
+
+Left and right moves of a single 16-bit row are looked up in precomputed
+tables, so a full move is four table lookups (plus a transpose for the
+vertical directions). The tables take a few hundred milliseconds to build,
+so they are built the first time a move is made (or load_tables is called).
+from_matrix() and to_matrix() convert to and from the list of lists used
+by GameEngine and the save file.
+
+Tiles saturate at 32768: two 32768 tiles do not merge.
+"""
+import threading
+
+ROW_MASK = 0xFFFF
+MAX_EXPONENT = 15
+
+
+def _slide_row_left(row):
+    """
+    Given a 16-bit row, returns (new row, score gained) after sliding left
+
+    e.g. exponents [1, 1, 2, 0] (2 2 4 0) ==> [2, 2, 0, 0] (4 4 0 0), 4
+    """
+    cells = [(row >> (4 * j)) & 0xF for j in range(4)]
+
+    # Stack, then merge pairs from the left
+    tiles = [cell for cell in cells if cell != 0]
+    result = []
+    score = 0
+    j = 0
+    while j < len(tiles):
+        if j + 1 < len(tiles) and tiles[j] == tiles[j + 1] and \
+                tiles[j] < MAX_EXPONENT:
+            result.append(tiles[j] + 1)
+            score += 2 ** (tiles[j] + 1)
+            j += 2
+        else:
+            result.append(tiles[j])
+            j += 1
+
+    result += [0] * (4 - len(result))
+
+    new_row = 0
+    for j, cell in enumerate(result):
+        new_row |= cell << (4 * j)
+
+    return new_row, score
+
+
+def _reverse_row(row):
+    """Mirrors the four nibbles of a 16-bit row"""
+    return ((row & 0xF) << 12) | ((row & 0xF0) << 4) | \
+        ((row >> 4) & 0xF0) | (row >> 12)
+
+
+def _build_tables():
+    """Builds the 65,536 entry row tables for left / right moves and score"""
+    row_left = [0] * (ROW_MASK + 1)
+    row_right = [0] * (ROW_MASK + 1)
+    row_score = [0] * (ROW_MASK + 1)
+
+    for row in range(ROW_MASK + 1):
+        new_row, score = _slide_row_left(row)
+        row_left[row] = new_row
+        row_score[row] = score
+
+        # Sliding right is sliding the mirrored row left
+        reversed_row = _reverse_row(row)
+        row_right[reversed_row] = _reverse_row(new_row)
+
+    return row_left, row_right, row_score
+
+
+# Row tables, built on first use (see load_tables)
+# ROW_LEGAL: for each row, bit 0 set if sliding it left changes it,
+# bit 2 for right (the bits of game_engine.LEFT and RIGHT)
+ROW_LEFT = ROW_RIGHT = ROW_SCORE = ROW_LEGAL = None
+_tables_lock = threading.Lock()
+
+
+def load_tables():
+    """
+    Builds the row tables, the first time it is called (from any thread),
+    and returns (ROW_LEFT, ROW_RIGHT, ROW_SCORE, ROW_LEGAL)
+    """
+    global ROW_LEFT, ROW_RIGHT, ROW_SCORE, ROW_LEGAL
+    with _tables_lock:
+        if ROW_LEGAL is None:
+            row_left, row_right, row_score = _build_tables()
+            row_legal = [
+                (row_left[row] != row) | ((row_right[row] != row) << 2)
+                for row in range(ROW_MASK + 1)
+            ]
+            ROW_LEFT, ROW_RIGHT, ROW_SCORE = row_left, row_right, row_score
+            ROW_LEGAL = row_legal
+
+    return ROW_LEFT, ROW_RIGHT, ROW_SCORE, ROW_LEGAL
+
+
+def from_matrix(matrix):
+    """
+    Packs a 4x4 list of tile values (0, 2, 4 ...) into a bitboard
+    (tiles above 32768 can't be held, and are packed as 32768)
+    """
+    board = 0
+    for i in range(4):
+        for j in range(4):
+            value = int(matrix[i][j])
+            if value:
+                exponent = min(value.bit_length() - 1, MAX_EXPONENT)
+                board |= exponent << (16 * i + 4 * j)
+
+    return board
+
+
+def to_matrix(board):
+    """Unpacks a bitboard into a 4x4 list of tile values (0, 2, 4 ...)"""
+    matrix = []
+    for i in range(4):
+        row = []
+        for j in range(4):
+            exponent = (board >> (16 * i + 4 * j)) & 0xF
+            row.append(1 << exponent if exponent else 0)
+        matrix.append(row)
+
+    return matrix
+
+
+def transpose(board):
+    """Transposes the board, swapping cell (i, j) with cell (j, i)"""
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def _move_rows(board, right):
+    """Slides all four rows left (or right), returning (board, score)"""
+    if ROW_LEGAL is None:
+        load_tables()
+
+    table = ROW_RIGHT if right else ROW_LEFT
+    r0 = board & ROW_MASK
+    r1 = (board >> 16) & ROW_MASK
+    r2 = (board >> 32) & ROW_MASK
+    r3 = board >> 48
+    new_board = table[r0] | (table[r1] << 16) | \
+        (table[r2] << 32) | (table[r3] << 48)
+    score = ROW_SCORE[r0] + ROW_SCORE[r1] + ROW_SCORE[r2] + ROW_SCORE[r3]
+    return new_board, score
+
+
+def move_left(board):
+    """Swipe tiles left, returns (board, score gained)"""
+    return _move_rows(board, False)
+
+
+def move_right(board):
+    """Swipe tiles right, returns (board, score gained)"""
+    return _move_rows(board, True)
+
+
+def move_up(board):
+    """Swipe tiles up, returns (board, score gained)"""
+    new_board, score = _move_rows(transpose(board), False)
+    return transpose(new_board), score
+
+
+def move_down(board):
+    """Swipe tiles down, returns (board, score gained)"""
+    new_board, score = _move_rows(transpose(board), True)
+    return transpose(new_board), score
+
+
+# Move functions, indexed in the same order as game_engine.DIRECTIONS
+MOVES = (move_left, move_up, move_right, move_down)
+
+
+def legal_moves(board):
+    """
+    Returns a 4-bit mask of the directions which change the board,
+    with bit k set for game_engine.DIRECTIONS[k] (0 = game over)
+    """
+    if ROW_LEGAL is None:
+        load_tables()
+
+    transposed = transpose(board)
+    rows = ROW_LEGAL[board & ROW_MASK] | \
+        ROW_LEGAL[(board >> 16) & ROW_MASK] | \
+        ROW_LEGAL[(board >> 32) & ROW_MASK] | \
+        ROW_LEGAL[board >> 48]
+    columns = ROW_LEGAL[transposed & ROW_MASK] | \
+        ROW_LEGAL[(transposed >> 16) & ROW_MASK] | \
+        ROW_LEGAL[(transposed >> 32) & ROW_MASK] | \
+        ROW_LEGAL[transposed >> 48]
+
+    # Sliding columns left / right is sliding the board up / down
+    return rows | (columns << 1)
+
+
+def empty_cells(board):
+    """Returns the list of empty cell indices (4 * i + j)"""
+    return [
+        index for index in range(16)
+        if not (board >> (4 * index)) & 0xF
+    ]
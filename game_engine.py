@@ -0,0 +1,357 @@
+"""
+The 2048 game rules, with no user interface attached.
+
+Nothing in this module imports tkinter, so games can be played,
+simulated and tested on machines without a display server.
+"""
+import bisect
+import os
+
+
+# The four swipe directions, in the order used throughout the program
+DIRECTIONS = ('left', 'up', 'right', 'down')
+
+# Bits of the legal move mask (see GameEngine.legal_moves),
+# bit k stands for DIRECTIONS[k]
+LEFT = 1
+UP = 2
+RIGHT = 4
+DOWN = 8
+ALL_MOVES = LEFT | UP | RIGHT | DOWN
+
+
+def board_lines(size, direction):
+    """
+    Returns the rows (left / right) or columns (up / down) of a board,
+    as lists of (row, column) cells starting at the edge slid towards
+
+    e.g. board_lines(4, 'right')[0] == [(0, 3), (0, 2), (0, 1), (0, 0)]
+    """
+    if direction == 'left':
+        return [[(i, k) for k in range(size)] for i in range(size)]
+    elif direction == 'right':
+        return [[(i, size - 1 - k) for k in range(size)] for i in range(size)]
+    elif direction == 'up':
+        return [[(k, j) for k in range(size)] for j in range(size)]
+    elif direction == 'down':
+        return [[(size - 1 - k, j) for k in range(size)] for j in range(size)]
+
+    raise ValueError('Unknown direction: {}'.format(direction))
+
+
+def slide_line(values):
+    """
+    Slides one row / column towards its start:
+    stacks the tiles (removing 0 tiles in between),
+    and merges each pair of adjacent congruent tiles once
+
+    2 0 2 4      ---->      4 4 0 0
+    2 2 2 2                 4 4 0 0
+
+    Returns (new values, score gained)
+    """
+    tiles = [value for value in values if value != 0]
+    result = []
+    score = 0
+
+    k = 0
+    while k < len(tiles):
+        if k + 1 < len(tiles) and tiles[k] == tiles[k + 1]:
+            result.append(tiles[k] * 2)
+            score += tiles[k] * 2
+            k += 2
+        else:
+            result.append(tiles[k])
+            k += 1
+
+    return result + [0] * (len(values) - len(result)), score
+
+
+_MASK_64 = (1 << 64) - 1
+
+# Added to the SplitMix64 state on every draw
+_GAMMA = 0x9E3779B97F4A7C15
+
+# Draws used by each spawn (see GameEngine.add_two)
+DRAWS_PER_SPAWN = 2
+
+
+def _mix64(value):
+    """The SplitMix64 output function - scrambles a 64-bit integer"""
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK_64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK_64
+    return value ^ (value >> 31)
+
+
+class SpawnRNG:
+    """
+    Seedable random number generator for tile spawns (SplitMix64)
+
+    The whole state is one 64-bit integer, so it fits in the save file,
+    and the output does not depend on the Python version - the same seed
+    always gives the same spawns.
+    """
+
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = int.from_bytes(os.urandom(8), 'little')
+
+        self.seed = seed & _MASK_64
+        self.state = self.seed
+
+    def next64(self):
+        """Returns the next random 64-bit integer"""
+        self.state = (self.state + _GAMMA) & _MASK_64
+        return _mix64(self.state)
+
+    def randbelow(self, n):
+        """Returns a random integer in [0, n), using exactly one draw"""
+        return (self.next64() * n) >> 64
+
+    def choice(self, sequence):
+        """Returns a random item of a non-empty sequence"""
+        return sequence[self.randbelow(len(sequence))]
+
+    def getstate(self):
+        """Returns the generator state, for saving"""
+        return self.state
+
+    def setstate(self, state):
+        """Restores a state returned by getstate"""
+        self.state = state & _MASK_64
+
+    def rewind(self, draws):
+        """
+        Steps the generator back by a number of draws, so they come out
+        again (e.g. the spawn of a move which is undone)
+        """
+        self.state = (self.state - draws * _GAMMA) & _MASK_64
+
+
+class GameEngine:
+    """
+    This class is the 2048 game model
+
+    It owns the game matrix, the score, the spawn random number generator
+    and the game over test. The MainGame frame is only a view over it.
+
+    The empty cells are kept in a sorted list, updated as tiles are written,
+    so spawning a tile and checking for empty tiles never scan the board.
+    Being sorted, the list (and so the next spawn) depends only on the
+    board and the RNG state, which makes saved games and replays repeatable.
+    """
+
+    def __init__(self, tiles_per_row=4, seed=None):
+        # Size of the (square) board
+        self.TILES_PER_ROW = tiles_per_row
+
+        # The cells of each row / column, for every direction
+        self.LINES = {
+            direction: board_lines(tiles_per_row, direction)
+            for direction in DIRECTIONS
+        }
+
+        # Random number generator used for spawning tiles
+        self.rng = SpawnRNG(seed)
+
+        # Generate the grid matrix (matrix of values) and the score
+        self.grid = [[0] * tiles_per_row for _ in range(tiles_per_row)]
+        self.score = 0
+
+        # The (row, column, value) of the most recently spawned tile
+        self.last_spawn = None
+
+    @property
+    def grid(self):
+        """The game matrix - a list of rows of tile values (0 = empty)"""
+        return self._grid
+
+    @grid.setter
+    def grid(self, matrix):
+        # Replacing the whole matrix (e.g. loading a game) rebuilds the
+        # empty cell list; moves update it one cell at a time
+        self._grid = matrix
+        self.empty_cells = [
+            (i, j)
+            for i in range(self.TILES_PER_ROW)
+            for j in range(self.TILES_PER_ROW)
+            if matrix[i][j] == 0
+        ]
+
+    def set_tile(self, i, j, value):
+        """
+        Writes one tile, keeping the empty cell list up to date
+        (a binary search in at most 16 cells)
+        """
+        was_empty = self._grid[i][j] == 0
+        self._grid[i][j] = value
+
+        if was_empty and value != 0:
+            del self.empty_cells[bisect.bisect_left(self.empty_cells, (i, j))]
+
+        elif not was_empty and value == 0:
+            bisect.insort(self.empty_cells, (i, j))
+
+    @property
+    def seed(self):
+        """The seed the spawn generator was created with"""
+        return self.rng.seed
+
+    def new_game(self):
+        """Clears the board, resets the score and spawns the first two tiles"""
+        self.grid = [
+            [0] * self.TILES_PER_ROW for _ in range(self.TILES_PER_ROW)
+        ]
+        self.score = 0
+        self.add_two()
+        self.add_two()
+
+    def add_two(self):
+        """
+        Adds a randomly placed two or four onto the game matrix,
+        P(x=2) = 0.75,
+        P(x=4) = 0.25
+
+        The cell is picked uniformly from the empty cells.
+        add_two is only called when an empty tile exists.
+        Uses exactly DRAWS_PER_SPAWN draws of the generator.
+        """
+        i, j = self.rng.choice(self.empty_cells)
+        value = 4 if self.rng.randbelow(4) == 0 else 2
+        self.set_tile(i, j, value)
+
+        # Kept for the move log
+        self.last_spawn = (i, j, value)
+
+    def any_empty_tiles(self):
+        """
+        Returns False if NO tiles remaining
+        Returns True if empty tiles exist
+        """
+        return len(self.empty_cells) > 0
+
+    def legal_moves(self):
+        """
+        Returns a 4-bit mask of the directions which change the board,
+        where bit k is set if DIRECTIONS[k] is legal (0 = game over).
+
+        Worked out in one pass over each pair of adjacent tiles:
+        a tile can slide into an empty neighbour, and equal tiles merge
+        """
+        size = self.TILES_PER_ROW
+        grid = self._grid
+        mask = 0
+
+        for i in range(size):
+            for j in range(size):
+                value = grid[i][j]
+
+                # Pair with the tile to the right
+                if j + 1 < size:
+                    right = grid[i][j + 1]
+                    if value != 0 and value == right:
+                        mask |= LEFT | RIGHT
+                    elif value == 0 and right != 0:
+                        mask |= LEFT
+                    elif value != 0 and right == 0:
+                        mask |= RIGHT
+
+                # Pair with the tile below
+                if i + 1 < size:
+                    below = grid[i + 1][j]
+                    if value != 0 and value == below:
+                        mask |= UP | DOWN
+                    elif value == 0 and below != 0:
+                        mask |= UP
+                    elif value != 0 and below == 0:
+                        mask |= DOWN
+
+            # Every direction is legal - no need to look further
+            if mask == ALL_MOVES:
+                break
+
+        return mask
+
+    def is_game_over(self):
+        """Returns True if no slides or merges are possible in any direction"""
+        # A tile can always slide into an empty cell
+        return not self.any_empty_tiles() and self.legal_moves() == 0
+
+    def move(self, direction):
+        """
+        Swipes the tiles in the given direction (see DIRECTIONS),
+        spawning a new tile if anything moved.
+
+        The matrix is changed in place.
+        Returns True if the board changed, otherwise False
+        """
+        if direction not in self.LINES:
+            raise ValueError('Unknown direction: {}'.format(direction))
+
+        changed = False
+        for line in self.LINES[direction]:
+            values = [self._grid[i][j] for i, j in line]
+            new_values, gained = slide_line(values)
+            if new_values == values:
+                continue
+
+            # Only write back the cells which changed
+            changed = True
+            self.score += gained
+            for (i, j), old, new in zip(line, values, new_values):
+                if old != new:
+                    self.set_tile(i, j, new)
+
+        if changed and self.any_empty_tiles():
+            self.add_two()
+
+        return changed
+
+    def push_left(self):
+        """Swipe tiles left"""
+        return self.move('left')
+
+    def push_up(self):
+        """Swipe tiles up"""
+        return self.move('up')
+
+    def push_right(self):
+        """Swipe tiles right"""
+        return self.move('right')
+
+    def push_down(self):
+        """Swipe tiles down"""
+        return self.move('down')
+
+
+def slide_trajectories(grid, direction):
+    """
+    Works out where every tile on grid goes when swiped in direction,
+    without changing the grid. Used to animate moves.
+
+    Returns a list of ((from row, from column), (to row, to column), value),
+    where two tiles with the same destination merge there.
+    """
+    trajectories = []
+
+    for cells in board_lines(len(grid), direction):
+        # Each tile merges into the previous one if equal (and that one
+        # has not merged already), otherwise it takes the next free cell
+        target = -1
+        previous_value = None
+        previous_merged = False
+        for i, j in cells:
+            value = grid[i][j]
+            if value == 0:
+                continue
+
+            if value == previous_value and not previous_merged:
+                previous_merged = True
+            else:
+                target += 1
+                previous_value = value
+                previous_merged = False
+
+            trajectories.append(((i, j), cells[target], value))
+
+    return trajectories
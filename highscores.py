@@ -0,0 +1,422 @@
+"""
+High score storage.
+
+Two stores with the same interface (add, count, page, close):
+
+ScoreStore keeps every finished game as one row of a SQLite database.
+Each way the high score table can be sorted has its own index, so showing
+a page of the table is a single LIMIT / OFFSET query.
+
+JsonlScoreStore keeps every finished game as one line of a JSON Lines
+file. Finishing a game appends and fsyncs one line, so the file is never
+rewritten in place and a crash loses at most the game being written.
+
+Entries are passed around as dicts with the keys of the original
+2048highscores.json file: 'name', 'score', 'prediction' and 'score / s'.
+Use open_store to pick the store from the file extension.
+
+Leaderboard sits in front of either store, and keeps the top entries of
+every ranking in memory, so the first pages never touch the file.
+"""
+import heapq
+import json
+import os
+import sqlite3
+import threading
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS scores (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    prediction INTEGER NOT NULL,
+    score_per_second REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scores_by_score
+    ON scores (score DESC);
+CREATE INDEX IF NOT EXISTS scores_by_prediction
+    ON scores (abs(prediction));
+CREATE INDEX IF NOT EXISTS scores_by_score_per_second
+    ON scores (score_per_second DESC);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+# How the table is ordered for each ranking (ties: oldest game first)
+# Each order matches one of the indexes above
+SORT_ORDERS = {
+    'score': 'score DESC, id',
+    'prediction': 'abs(prediction), id',
+    'score / s': 'score_per_second DESC, id'
+}
+
+# The same orders, as sort keys for entry dicts (smallest first)
+SORT_KEYS = {
+    'score': lambda entry: -entry['score'],
+    'prediction': lambda entry: abs(entry['prediction']),
+    'score / s': lambda entry: -entry['score / s']
+}
+
+
+def make_entry(name, score, prediction, score_per_second):
+    """Returns the entry dict of one finished game"""
+    return {
+        'name': name,
+        'score': int(score),
+        'prediction': int(prediction),
+        'score / s': float(score_per_second)
+    }
+
+
+def read_json_entries(json_path):
+    """
+    Returns the entries of an old 2048highscores.json file
+    (a blank or missing file has none)
+    """
+    if not os.path.exists(json_path):
+        return []
+
+    with open(json_path, 'r') as f:
+        try:
+            data = json.load(f)
+        except ValueError:
+            return []
+
+    return [
+        make_entry(entry['name'], entry['score'],
+                   entry['prediction'], entry['score / s'])
+        for entry in data
+    ]
+
+
+def open_store(path):
+    """Opens a JsonlScoreStore for .jsonl paths, otherwise a ScoreStore"""
+    if path.endswith('.jsonl'):
+        return JsonlScoreStore(path)
+
+    return ScoreStore(path)
+
+
+class ScoreStore:
+    """
+    This class is the high score table, stored in a SQLite database
+
+    Use page() to read one page of a ranking (see SORT_ORDERS),
+    and add() to record a finished game.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+
+    def add(self, name, score, prediction, score_per_second):
+        """Records one finished game, in its own transaction"""
+        with self.connection:
+            self.connection.execute(
+                'INSERT INTO scores (name, score, prediction, '
+                'score_per_second) VALUES (?, ?, ?, ?)',
+                (name, int(score), int(prediction), float(score_per_second)))
+
+    def count(self):
+        """Returns the number of games recorded"""
+        return self.connection.execute(
+            'SELECT count(*) FROM scores').fetchone()[0]
+
+    def entries(self):
+        """Yields every entry, oldest first"""
+        rows = self.connection.execute(
+            'SELECT name, score, prediction, score_per_second FROM scores '
+            'ORDER BY id')
+        for name, score, prediction, score_per_second in rows:
+            yield make_entry(name, score, prediction, score_per_second)
+
+    def page(self, sort='score', limit=4, offset=0):
+        """
+        Returns up to limit entries of the ranking sort (see SORT_ORDERS),
+        skipping the first offset entries
+        """
+        rows = self.connection.execute(
+            'SELECT name, score, prediction, score_per_second FROM scores '
+            'ORDER BY {} LIMIT ? OFFSET ?'.format(SORT_ORDERS[sort]),
+            (limit, offset))
+
+        return [
+            {
+                'name': name,
+                'score': score,
+                'prediction': prediction,
+                'score / s': score_per_second
+            }
+            for name, score, prediction, score_per_second in rows
+        ]
+
+    def import_json(self, json_path):
+        """
+        Copies the entries of an old 2048highscores.json file into the store.
+        Only done once - later calls do nothing.
+
+        Returns the number of entries imported
+        """
+        with self.connection:
+            imported = self.connection.execute(
+                "SELECT value FROM meta WHERE key = 'imported_json'"
+            ).fetchone()
+            if imported is not None:
+                return 0
+
+            data = read_json_entries(json_path)
+            self.connection.executemany(
+                'INSERT INTO scores (name, score, prediction, '
+                'score_per_second) VALUES (?, ?, ?, ?)',
+                [
+                    (entry['name'], entry['score'],
+                     entry['prediction'], entry['score / s'])
+                    for entry in data
+                ])
+            self.connection.execute(
+                "INSERT INTO meta (key, value) VALUES ('imported_json', ?)",
+                (json_path,))
+
+        return len(data)
+
+    def close(self):
+        """Closes the database"""
+        self.connection.close()
+
+
+class JsonlScoreStore:
+    """
+    This class is the high score table, stored as an append-only
+    JSON Lines file - one entry per line, oldest game first
+
+    Entries are read lazily, one line at a time, so a page of a ranking
+    only keeps offset + limit entries in memory. A line cut short by a
+    crash is skipped when reading, and dropped by compact().
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        # Appends and compaction never touch the file at the same time
+        self.lock = threading.Lock()
+        self.file = open(path, 'a', encoding='utf-8')
+        self.compaction = None
+
+        # If the last line was cut short, start the next one on a new line
+        if self.file.tell() > 0:
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self.file.write('\n')
+                    self.file.flush()
+
+        # Number of entries, counted on first use
+        self.entry_count = None
+
+    def add(self, name, score, prediction, score_per_second):
+        """Records one finished game: one line, written and fsynced"""
+        line = json.dumps(
+            make_entry(name, score, prediction, score_per_second),
+            separators=(',', ':')) + '\n'
+
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+            if self.entry_count is not None:
+                self.entry_count += 1
+
+    def entries(self):
+        """Yields every entry in the file, oldest first, skipping bad lines"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def count(self):
+        """Returns the number of games recorded"""
+        if self.entry_count is None:
+            self.entry_count = sum(1 for entry in self.entries())
+
+        return self.entry_count
+
+    def page(self, sort='score', limit=4, offset=0):
+        """
+        Returns up to limit entries of the ranking sort (see SORT_KEYS),
+        skipping the first offset entries
+        """
+        ranked = heapq.nsmallest(
+            offset + limit, self.entries(), key=SORT_KEYS[sort])
+        return ranked[offset:]
+
+    def import_json(self, json_path):
+        """
+        Copies the entries of an old 2048highscores.json file into the store,
+        if the store is still empty.
+
+        Returns the number of entries imported
+        """
+        if os.path.getsize(self.path) > 0:
+            return 0
+
+        data = read_json_entries(json_path)
+        with self.lock:
+            for entry in data:
+                self.file.write(json.dumps(entry, separators=(',', ':')))
+                self.file.write('\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+        self.entry_count = None
+        return len(data)
+
+    def compact(self):
+        """
+        Rewrites the file without lines that are blank or cut short
+        (e.g. by a crash mid-write). Nothing is rewritten if every line
+        is whole.
+
+        The file is copied up to its current end, then anything appended
+        meanwhile is copied under the lock, and the copy swapped in with
+        os.replace - so a crash during compaction never loses the table.
+
+        Returns the number of lines dropped
+        """
+        with self.lock:
+            end = os.path.getsize(self.path)
+
+        # Copy the whole lines, outside the lock
+        dropped = 0
+        temporary_path = self.path + '.tmp'
+        with open(self.path, 'rb') as f, \
+                open(temporary_path, 'wb') as temporary:
+            while f.tell() < end:
+                line = f.readline()
+                try:
+                    json.loads(line)
+                except ValueError:
+                    dropped += 1
+                    continue
+                temporary.write(line)
+
+            if dropped == 0:
+                temporary.close()
+                os.remove(temporary_path)
+                return 0
+
+            # Bring over the lines added since, then swap the files
+            # (closing them first, which Windows needs to replace a file)
+            with self.lock:
+                f.seek(end)
+                temporary.write(f.read())
+                temporary.flush()
+                os.fsync(temporary.fileno())
+                temporary.close()
+                f.close()
+
+                self.file.close()
+                try:
+                    os.replace(temporary_path, self.path)
+                except OSError:
+                    # The file is open elsewhere: keep it as it is
+                    os.remove(temporary_path)
+                    dropped = 0
+                self.file = open(self.path, 'a', encoding='utf-8')
+                self.entry_count = None
+
+        return dropped
+
+    def compact_in_background(self):
+        """Starts compact() on a background thread"""
+        if self.compaction is None or not self.compaction.is_alive():
+            self.compaction = threading.Thread(
+                target=self.compact, daemon=True)
+            self.compaction.start()
+
+    def close(self):
+        """Waits for any compaction to finish, and closes the file"""
+        if self.compaction is not None:
+            self.compaction.join()
+
+        self.file.close()
+
+
+class Leaderboard:
+    """
+    The top size entries of every ranking (see SORT_KEYS),
+    kept in front of a score store with the same interface
+
+    Each ranking has a bounded heap whose root is its worst kept entry,
+    so recording a game costs O(log size) per ranking. Pages within the
+    top entries are served from memory; pages further down go to the store.
+    """
+
+    def __init__(self, store, size=100):
+        self.store = store
+        self.size = size
+
+        # Heap items are (-sort key, -game number, entry), so the root
+        # is the worst entry, and ties keep the oldest game
+        self.heaps = {sort: [] for sort in SORT_KEYS}
+
+        # Each heap as a ranked list, rebuilt when the heap changes
+        self.ranked = {}
+
+        # Read every stored entry once
+        self.entry_count = 0
+        for entry in store.entries():
+            self.insert(entry)
+
+    def insert(self, entry):
+        """Offers an entry to every ranking's heap"""
+        number = self.entry_count
+        self.entry_count += 1
+
+        for sort, key in SORT_KEYS.items():
+            heap = self.heaps[sort]
+            item = (-key(entry), -number, entry)
+            if len(heap) < self.size:
+                heapq.heappush(heap, item)
+            elif item[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, item)
+            else:
+                continue
+
+            self.ranked.pop(sort, None)
+
+    def add(self, name, score, prediction, score_per_second):
+        """Records one finished game in the store and the rankings"""
+        self.store.add(name, score, prediction, score_per_second)
+        self.insert(make_entry(name, score, prediction, score_per_second))
+
+    def count(self):
+        """Returns the number of games recorded"""
+        return self.entry_count
+
+    def page(self, sort='score', limit=4, offset=0):
+        """
+        Returns up to limit entries of the ranking sort (see SORT_KEYS),
+        skipping the first offset entries
+        """
+        if offset + limit > self.size and self.entry_count > self.size:
+            return self.store.page(sort, limit, offset)
+
+        if sort not in self.ranked:
+            self.ranked[sort] = [
+                entry for key, number, entry in
+                sorted(self.heaps[sort], reverse=True)
+            ]
+
+        return self.ranked[sort][offset:offset + limit]
+
+    def close(self):
+        """Closes the store"""
+        self.store.close()
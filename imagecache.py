@@ -0,0 +1,157 @@
+"""
+Process-wide cache of decoded images.
+
+Each image file is decoded once (optionally scaled to a fixed size),
+and made into a single PhotoImage which every frame shares, so showing
+a screen again never goes back to the disk.
+
+Tk reads PNG files itself, so a PNG which is already the right size is
+loaded straight into a PhotoImage. Pillow is only imported for images Tk
+can't load as they are - other formats, or PNGs which need scaling - as
+importing it takes longer than starting tkinter. Without Pillow, such
+images are loaded by tk.PhotoImage unscaled (PNG and GIF only).
+
+Files can be read ahead of time on a background thread (prewarm), and
+any image which needs Pillow decoded there too. The PhotoImage itself is
+made on the Tk thread, the first time it is used.
+"""
+import base64
+import struct
+import threading
+import tkinter as tk
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# The signature, then the IHDR chunk's length and type, width and height
+PNG_HEADER = struct.Struct('>8s8xII')
+
+
+# (Image, ImageTk) once Pillow is imported, False if it is not installed
+_pillow = None
+
+
+def png_size(path):
+    """Returns the (width, height) of a PNG file, or None if it is not one"""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(PNG_HEADER.size)
+    except OSError:
+        return None
+
+    if len(header) < PNG_HEADER.size or \
+            not header.startswith(PNG_SIGNATURE):
+        return None
+
+    signature, width, height = PNG_HEADER.unpack(header)
+    return width, height
+
+
+def load_pillow():
+    """
+    Imports Pillow the first time it is needed.
+    Returns its (Image, ImageTk) modules, or None if it is not installed
+    """
+    global _pillow
+    if _pillow is None:
+        try:
+            from PIL import Image, ImageTk
+            _pillow = (Image, ImageTk)
+        except ImportError:
+            _pillow = False
+
+    return _pillow or None
+
+
+class ImageCache:
+    """
+    This class holds the decoded images, and their PhotoImages, by path
+    """
+
+    def __init__(self, size=None):
+        # (width, height) every image is scaled to, or None to keep its size
+        self.size = size
+
+        # Decoded Pillow images, or the base64 text of PNGs Tk loads
+        # itself, shared with the prewarm thread
+        self.lock = threading.Lock()
+        self.decoded = {}
+        self.png_data = {}
+
+        # PhotoImages, only used on the Tk thread
+        self.photos = {}
+        self.prewarm_thread = None
+
+    def is_native(self, path):
+        """Returns True if Tk can load path as it is (a PNG of the size)"""
+        size = png_size(path)
+        return size is not None and (self.size is None or size == self.size)
+
+    def read_png(self, path):
+        """Returns the base64 text of a PNG which Tk loads, read once"""
+        with self.lock:
+            data = self.png_data.get(path)
+        if data is not None:
+            return data
+
+        with open(path, 'rb') as f:
+            data = base64.b64encode(f.read()).decode('ascii')
+
+        with self.lock:
+            return self.png_data.setdefault(path, data)
+
+    def decode(self, path):
+        """
+        Returns the decoded (and scaled) Pillow image of path,
+        decoding it once, or None without Pillow
+        """
+        with self.lock:
+            image = self.decoded.get(path)
+        if image is not None:
+            return image
+
+        pillow = load_pillow()
+        if pillow is None:
+            return None
+
+        Image, ImageTk = pillow
+        image = Image.open(path)
+        image.load()
+        if self.size is not None and image.size != self.size:
+            image = image.resize(self.size)
+
+        # If another thread got there first, keep its image
+        with self.lock:
+            return self.decoded.setdefault(path, image)
+
+    def photo(self, path):
+        """Returns the shared PhotoImage of path (call on the Tk thread)"""
+        photo = self.photos.get(path)
+        if photo is None:
+            if self.is_native(path):
+                photo = tk.PhotoImage(data=self.read_png(path))
+            else:
+                image = self.decode(path)
+                if image is None:
+                    photo = tk.PhotoImage(file=path)
+                else:
+                    Image, ImageTk = load_pillow()
+                    photo = ImageTk.PhotoImage(image)
+            self.photos[path] = photo
+
+        return photo
+
+    def prewarm(self, paths):
+        """Reads (or decodes) the images of paths on a background thread"""
+        if self.prewarm_thread is not None:
+            return
+
+        def decode_all():
+            for path in paths:
+                if self.is_native(path):
+                    self.read_png(path)
+                else:
+                    self.decode(path)
+
+        self.prewarm_thread = threading.Thread(target=decode_all, daemon=True)
+        self.prewarm_thread.start()
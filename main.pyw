@@ -1,22 +1,58 @@
+# Startup is timed from this first import (see MainProgram.mark_startup)
+import startclock
+
+import time
 import tkinter as tk
 from tkinter.font import Font
-from PIL import ImageTk, Image
-import random
-import math
+import collections
 import json
-import time
+import os
+import sys
+import threading
+
+import bitboard
+from ai import ExpectimaxAI, ParallelExpectimaxAI
+from game_engine import (
+    DRAWS_PER_SPAWN, GameEngine, SpawnRNG, slide_trajectories)
+from highscores import JsonlScoreStore, Leaderboard, open_store
+from imagecache import ImageCache
+from movelog import MoveLog, Replay, can_log
+from savefile import CLEAR, AutoSaver, SaveError, SaveSlots, read_save
 
 # This allows Tkinter to run in high resolution - fixes blurry font
-from ctypes import windll
-windll.shcore.SetProcessDpiAwareness(1)
+# (Windows only; SetProcessDpiAwareness needs Windows 8.1 or later)
+if sys.platform == 'win32':
+    try:
+        import ctypes
+        ctypes.windll.shcore.SetProcessDpiAwareness(1)
+    except (AttributeError, OSError):
+        pass
+
+
+def command_line_value(option, default):
+    """
+    Returns the value after option on the command line, or default
+    e.g. python main.pyw --highscores 2048highscores.db
+    """
+    if option in sys.argv[:-1]:
+        return sys.argv[sys.argv.index(option) + 1]
+
+    return default
 
 
 class MainProgram(tk.Tk):
     """This class is the program skeleton - the Tk object"""
 
     def __init__(self):
+        # Time taken by each step of startup, printed once the window is up
+        # if the program is run with --startup-times
+        self.startup_times = []
+        self.startup_clock = startclock.START
+        self.mark_startup('imports')
+
         # Initialise Tk object
         tk.Tk.__init__(self)
+        self.mark_startup('tk')
 
         # Define window constants
         self.GAME_WINDOW_CAPTION = '2048 - Python Version'
@@ -47,6 +83,65 @@ class MainProgram(tk.Tk):
             self.INSTRUCTIONS_TEXT = data['instructions_text']
             self.CONTROLS_TEXT = data['controls_text']
             self.SAVE_TEMPLATE = data['save_template']
+        self.mark_startup('fonts and texts')
+
+        # Move animation: number of frames, and milliseconds per frame
+        # (0 frames turns animation off)
+        self.ANIMATION_FRAMES = 6
+        self.ANIMATION_FRAME_MS = 16
+
+        # Saved games, one slot each in the saves folder, with an index;
+        # games are saved automatically every so many moves or seconds,
+        # on a background thread (an old single save becomes a slot)
+        self.SAVE_DIRECTORY = 'saves'
+        self.LEGACY_SAVE_PATH = '2048save.json'
+        self.AUTOSAVE_MOVES = 10
+        self.AUTOSAVE_SECONDS = 30
+        # Longest wait for pending saves to be written before one is read
+        self.AUTOSAVE_FLUSH_SECONDS = 2
+        os.makedirs(self.SAVE_DIRECTORY, exist_ok=True)
+        self.save_slots = SaveSlots(self.SAVE_DIRECTORY)
+        self.save_slots.import_save(self.LEGACY_SAVE_PATH)
+        self.autosaver = AutoSaver(
+            every_moves=self.AUTOSAVE_MOVES,
+            every_seconds=self.AUTOSAVE_SECONDS,
+            on_write=self.save_slots.record)
+
+        # Folder the move logs of every game are kept in,
+        # and the delay between moves when watching a replay
+        self.LOG_DIRECTORY = 'logs'
+        self.REPLAY_STEP_MS = 150
+
+        # Key presses are applied in batches, once per this many milliseconds
+        self.INPUT_FRAME_MS = 16
+
+        # Number of processes the AI searches with (1 = on the Tk thread)
+        # The worker pool is shared by every game, and started on first use
+        self.AI_PROCESSES = min(4, os.cpu_count() or 1)
+        self.parallel_ai = None
+        self.protocol('WM_DELETE_WINDOW', self.close)
+
+        # High score store, opened on first use; scores from the old
+        # JSON high score file are copied into it the first time
+        # (a .jsonl path is an append-only log, anything else SQLite);
+        # run with --highscores 2048highscores.db to use SQLite
+        self.HIGHSCORES_PATH = command_line_value(
+            '--highscores', '2048highscores.jsonl')
+        self.HIGHSCORES_JSON_PATH = '2048highscores.json'
+        self.score_store = None
+
+        # Number of top entries of each ranking kept in memory
+        self.LEADERBOARD_SIZE = 100
+
+        # Decoded images, shared by every frame; the screen backgrounds
+        # are decoded in the background once the main menu is up
+        self.images = ImageCache(size=(self.GAME_WIDTH, self.GAME_HEIGHT))
+        self.BACKGROUND_IMAGES = [
+            'images/mainmenubackground.png',
+            'images/instructionsbackground.png',
+            'images/controlsbackground.png',
+            'images/highscoresbackground.png'
+        ]
 
         # Create the master frame
         self.container = tk.Frame(self)
@@ -55,8 +150,15 @@ class MainProgram(tk.Tk):
         # This variable holds pointer to current frame object
         self.current_frame = None
 
+        # Frames of these classes are built once and kept, then raised
+        # (and refreshed) when shown again; all others are rebuilt each time
+        self.CACHED_FRAMES = (MainMenu, Instructions, HighScores)
+        self.frames = {}
+
         # Display the main menu page
         self.show_frame(MainMenu)
+        self.mark_startup('main menu')
+        self.after_idle(self.finish_startup)
 
         # Initialise colors for the 2048 game;
         # Label is the text, and tile is the background.
@@ -74,6 +176,60 @@ class MainProgram(tk.Tk):
             2048: "#f2f2f0", 4096: "#f2f2f0", 8192: "#f2f2f0"
         }
 
+        # Precompute how every tile is drawn, up to 2^17 (131072),
+        # the largest tile possible on a 4x4 board
+        self.TILE_STYLES = self.build_tile_styles(17)
+        self.mark_startup('tile styles')
+
+    def build_tile_styles(self, max_exponent):
+        """
+        Returns {tile value: (background, text color, font)}
+        for blank tiles (0) and every tile value up to 2^max_exponent.
+
+        Numbers with more digits get a smaller font, so they fit the tile.
+        Font objects are shared between values with the same size.
+        """
+        fonts = {}
+        styles = {0: ('#d2d2d2', '#011c08', None)}
+
+        for exponent in range(1, max_exponent + 1):
+            number = 2 ** exponent
+            size = max(10, 20 - 3 * max(0, len(str(number)) - 3))
+            if size not in fonts:
+                fonts[size] = Font(family='Arial', size=size)
+
+            # Values above 8192 use the colors of the largest tiles
+            styles[number] = (
+                self.TILE_COLORS.get(number, '#000000'),
+                self.LABEL_COLORS.get(number, '#f2f2f0'),
+                fonts[size])
+
+        return styles
+
+    def mark_startup(self, step):
+        """Records the time taken by a step of startup, since the last step"""
+        now = time.perf_counter()
+        self.startup_times.append((step, now - self.startup_clock))
+        self.startup_clock = now
+
+    def finish_startup(self):
+        """
+        Runs once the window is first drawn: starts decoding the other
+        screen backgrounds and building the bitboard move tables, and
+        prints the startup times if asked to
+        """
+        self.mark_startup('first draw')
+        self.images.prewarm(self.BACKGROUND_IMAGES)
+
+        # Build the move tables before the first move needs them
+        threading.Thread(target=bitboard.load_tables, daemon=True).start()
+
+        if '--startup-times' in sys.argv:
+            for step, seconds in self.startup_times:
+                print('{:<16}{:8.1f} ms'.format(step, 1000 * seconds))
+            print('{:<16}{:8.1f} ms'.format(
+                'total', 1000 * (self.startup_clock - startclock.START)))
+
     def center_screen(self, window_width, window_height):
         """Centers the program window, within the whole screen"""
         offset_right = int(self.winfo_screenwidth() / 2 - window_width / 2)
@@ -82,20 +238,73 @@ class MainProgram(tk.Tk):
 
         self.geometry('+{}+{}'.format(offset_right, offset_down))
 
-    def show_frame(self, frame_class, new_game=True):
+    def get_parallel_ai(self):
+        """Returns the multi-process AI, starting its workers if needed"""
+        if self.parallel_ai is None:
+            self.parallel_ai = ParallelExpectimaxAI(
+                time_limit=0.04,
+                processes=self.AI_PROCESSES)
+
+        return self.parallel_ai
+
+    def get_score_store(self):
+        """Returns the high score store, opening it if needed"""
+        if self.score_store is None:
+            store = open_store(self.HIGHSCORES_PATH)
+            store.import_json(self.HIGHSCORES_JSON_PATH)
+
+            # Rank every stored game once; later games update the rankings
+            self.score_store = Leaderboard(store, self.LEADERBOARD_SIZE)
+
+            # Tidy up the log without holding up the window
+            if isinstance(store, JsonlScoreStore):
+                store.compact_in_background()
+
+        return self.score_store
+
+    def close(self):
+        """
+        Stops the AI worker processes, closes the high score store,
+        writes any pending autosave and closes the window
+        """
+        if self.parallel_ai is not None:
+            self.parallel_ai.shutdown()
+        if self.score_store is not None:
+            self.score_store.close()
+        self.autosaver.close()
+
+        self.destroy()
+
+    def show_frame(self, frame_class, new_game=True, slot=None):
         """
         Switches to the frame class passed as argument
         e.g. show_frame(MainMenu) ==> switches to main menu
+        e.g. show_frame(MainGame, new_game=False, slot=3) ==> loads slot 3
+
+        Cached frames (see CACHED_FRAMES) are raised instead of rebuilt,
+        and their refresh method, if any, brings their data up to date
         """
-        if self.current_frame is not None:
+        if self.current_frame is not None and \
+                type(self.current_frame) not in self.CACHED_FRAMES:
             self.current_frame.destroy()
 
-        if frame_class == MainGame and not new_game:
-            frame = frame_class(self.container, self, new_game=False)
+        if frame_class in self.frames:
+            frame = self.frames[frame_class]
+            if hasattr(frame, 'refresh'):
+                frame.refresh()
+
         else:
-            frame = frame_class(self.container, self)
+            if frame_class == MainGame and not new_game:
+                frame = frame_class(
+                    self.container, self, new_game=False, slot=slot)
+            else:
+                frame = frame_class(self.container, self)
 
-        frame.grid(row=0, column=0, sticky='news')
+            frame.grid(row=0, column=0, sticky='news')
+            if frame_class in self.CACHED_FRAMES:
+                self.frames[frame_class] = frame
+
+        frame.tkraise()
         self.current_frame = frame
 
 
@@ -132,12 +341,10 @@ class MainMenu(tk.Frame):
             button_frame,
             text='New Game',
             command=lambda: controller.show_frame(MainGame))
-        menu_button2 = tk.Button(
+        self.load_button = menu_button2 = tk.Button(
             button_frame,
             text='Load Game',
-            command=lambda: controller.show_frame(
-                MainGame,
-                new_game=False))
+            command=lambda: controller.show_frame(LoadGame))
         menu_button3 = tk.Button(
             button_frame,
             text='Instructions',
@@ -151,18 +358,9 @@ class MainMenu(tk.Frame):
             text='High Scores',
             command=lambda: controller.show_frame(HighScores))
 
-        # If there is no save file (or it's empty) - grey out the Load Button
-        try:
-            with open('2048save.json') as f:
-                content = f.readlines()
-                if len(content) == 0:
-                    menu_button2['state'] = tk.DISABLED
-                    menu_button2['bg'] = '#cccccc'
-                else:
-                    pass
-        except FileNotFoundError:
-            menu_button2['state'] = tk.DISABLED
-            menu_button2['bg'] = '#cccccc'
+        # Grey out the Load Button if there is no saved game
+        self.load_button_bg = menu_button2['bg']
+        self.refresh()
 
         buttons = [
             menu_button1,
@@ -193,13 +391,36 @@ class MainMenu(tk.Frame):
             button_frame['height'] +
             pixels_below_center)
 
+    def refresh(self):
+        """
+        Enables the Load Button if there are saved games,
+        or greys it out if there are none
+        (only the save slot index is read, never the saves)
+
+        Saves still waiting to be written count, unless they are
+        waiting to be deleted (e.g. the game just ended)
+        """
+        slots = self.controller.save_slots
+        pending = self.controller.autosaver.pending_states()
+        has_saves = any(
+            pending.get(slots.slot_path(entry['id'])) is not CLEAR
+            for entry in slots.slots()) or \
+            any(state is not CLEAR for state in pending.values())
+
+        if not has_saves:
+            self.load_button['state'] = tk.DISABLED
+            self.load_button['bg'] = '#cccccc'
+        else:
+            self.load_button['state'] = tk.NORMAL
+            self.load_button['bg'] = self.load_button_bg
+
     def display_background(self, image_path):
         """
         Given a relative path to an image (any image format),
         the image is drawn on frame canvas.
+        (the image is decoded once, and shared by every frame)
         """
-        background_image = Image.open(image_path)
-        self.canvas.image = ImageTk.PhotoImage(background_image)
+        self.canvas.image = self.controller.images.photo(image_path)
         self.canvas.create_image((0, 0), image=self.canvas.image, anchor='nw')
 
     def display_object_on_canvas(self, tk_object, x, y):
@@ -284,9 +505,9 @@ class Instructions(tk.Frame):
         """
         Given a relative path to an image (any image format),
         the image is drawn on frame canvas.
+        (the image is decoded once, and shared by every frame)
         """
-        background_image = Image.open(image_path)
-        self.canvas.image = ImageTk.PhotoImage(background_image)
+        self.canvas.image = self.controller.images.photo(image_path)
         self.canvas.create_image((0, 0), image=self.canvas.image, anchor='nw')
 
     def display_object_on_canvas(self, tk_object, x, y):
@@ -742,9 +963,9 @@ class Controls(tk.Frame):
         """
         Given a relative path to an image (any image format),
         the image is drawn on frame canvas.
+        (the image is decoded once, and shared by every frame)
         """
-        background_image = Image.open(image_path)
-        self.canvas.image = ImageTk.PhotoImage(background_image)
+        self.canvas.image = self.controller.images.photo(image_path)
         self.canvas.create_image((0, 0), image=self.canvas.image, anchor='nw')
 
     def display_object_on_canvas(self, tk_object, x, y):
@@ -769,10 +990,140 @@ class Controls(tk.Frame):
         self.canvas.delete(tk_object)
 
 
+class TileAnimator:
+    """
+    Slides tiles across the MainGame board canvas after a move
+
+    Each moving tile is drawn as a temporary rectangle and text item, moved
+    from its old cell to its new one over a fixed number of frames with
+    after(). Frames are timed from the start of the animation, so a late
+    frame is skipped (and counted in dropped_frames) rather than slowing
+    the animation down.
+    """
+
+    def __init__(self, game, frames=6, frame_ms=16):
+        self.game = game
+        self.canvas = game.main_grid
+        self.frames = frames
+        self.frame_ms = frame_ms
+
+        # State of the running animation
+        self.items = []
+        self.frame = 0
+        self.start_time = None
+        self.after_id = None
+        self.on_finish = None
+
+        # Statistics, over every animation played
+        self.frames_drawn = 0
+        self.dropped_frames = 0
+
+    def is_running(self):
+        """Returns True while an animation is playing"""
+        return self.after_id is not None
+
+    def animate(self, trajectories, on_finish):
+        """
+        Starts sliding tiles along the given trajectories
+        (see game_engine.slide_trajectories), calling on_finish at the end.
+
+        A running animation is finished straight away first,
+        so rapid key presses never queue up behind each other.
+        """
+        self.finish()
+        self.on_finish = on_finish
+
+        # Every tile before the move slides (even if only in place), so the
+        # board under the moving tiles is blank; update_grid redraws it at
+        # the end. This also clears the board drawn by finish() above, which
+        # already shows the result of this move.
+        size = self.game.TILES_PER_ROW
+        self.game.update_grid([[0] * size for _ in range(size)])
+
+        for source, destination, value in trajectories:
+            # Draw the moving tile on top of the board
+            i, j = source
+            background, foreground, font = \
+                self.game.controller.TILE_STYLES[value]
+            x, y = self.game.cell_position(i, j)
+            rectangle = self.canvas.create_rectangle(
+                x, y, x + self.game.TILE_SIZE, y + self.game.TILE_SIZE,
+                width=0, fill=background)
+            text = self.canvas.create_text(
+                x + self.game.TILE_SIZE // 2, y + self.game.TILE_SIZE // 2,
+                text=str(value), fill=foreground, font=font)
+
+            self.items.append((
+                rectangle,
+                text,
+                (x, y),
+                self.game.cell_position(*destination)))
+
+        self.frame = 0
+        self.start_time = time.perf_counter()
+        self.after_id = self.canvas.after(self.frame_ms, self.step)
+
+    def step(self):
+        """Draws the next frame, skipping any frames that are overdue"""
+        self.after_id = None
+        if not self.canvas.winfo_exists():
+            return
+
+        # Work out which frame should be showing by now
+        elapsed_ms = (time.perf_counter() - self.start_time) * 1000
+        due_frame = min(self.frames, int(elapsed_ms // self.frame_ms))
+        if due_frame > self.frame + 1:
+            self.dropped_frames += due_frame - self.frame - 1
+        self.frame = max(self.frame + 1, due_frame)
+        self.frames_drawn += 1
+
+        # Ease out - fast at first, slowing into place
+        progress = self.frame / self.frames
+        progress = 1 - (1 - progress) ** 2
+
+        size = self.game.TILE_SIZE
+        for rectangle, text, (x0, y0), (x1, y1) in self.items:
+            x = x0 + (x1 - x0) * progress
+            y = y0 + (y1 - y0) * progress
+            self.canvas.coords(rectangle, x, y, x + size, y + size)
+            self.canvas.coords(text, x + size / 2, y + size / 2)
+
+        if self.frame >= self.frames:
+            self.finish()
+            return
+
+        # Schedule the next frame for when it is due
+        next_ms = (self.frame + 1) * self.frame_ms - elapsed_ms
+        self.after_id = self.canvas.after(max(1, int(next_ms)), self.step)
+
+    def finish(self):
+        """Ends the running animation (if any) and draws the final board"""
+        if self.after_id is not None:
+            self.canvas.after_cancel(self.after_id)
+            self.after_id = None
+
+        for rectangle, text, source, destination in self.items:
+            self.canvas.delete(rectangle)
+            self.canvas.delete(text)
+        self.items = []
+
+        if self.on_finish is not None:
+            on_finish = self.on_finish
+            self.on_finish = None
+            on_finish()
+
+    def stats(self):
+        """Returns the frames drawn and dropped over every animation"""
+        return {
+            'frames_drawn': self.frames_drawn,
+            'dropped_frames': self.dropped_frames
+        }
+
+
 class MainGame(tk.Frame):
     """This class is the 2048 game frame"""
 
-    def __init__(self, parent, controller, new_game=True):
+    def __init__(self, parent, controller, new_game=True, slot=None):
         # Initialise the inherited frame object
         tk.Frame.__init__(
             self,
@@ -785,19 +1136,13 @@ class MainGame(tk.Frame):
         self.GRID_WIDTH = 600
         self.TILES_PER_ROW = 4
 
-        self.main_grid = tk.Frame(
+        self.main_grid = tk.Canvas(
             self,
             width=self.GRID_WIDTH,
             height=self.GRID_WIDTH,
-            bg='black')
-        self.main_grid.grid_propagate(0)
-
-        # Set the width of each row and column
-        for i in range(self.TILES_PER_ROW):
-            self.main_grid.grid_columnconfigure(
-                i, minsize=self.GRID_WIDTH // self.TILES_PER_ROW)
-            self.main_grid.grid_rowconfigure(
-                i, minsize=self.GRID_WIDTH // self.TILES_PER_ROW)
+            bg='black',
+            bd=0,
+            highlightthickness=0)
 
         # Place it on screen
         self.main_grid.place(
@@ -807,19 +1152,37 @@ class MainGame(tk.Frame):
             0.5,
             y=0)
 
+        # Create the 4x4 tile items once - update_grid only reconfigures them
+        self.create_tiles()
+
+        # Slides tiles between cells after each move.
+        # The AI turns this off, so autoplay runs at full speed
+        self.animator = TileAnimator(
+            self,
+            frames=controller.ANIMATION_FRAMES,
+            frame_ms=controller.ANIMATION_FRAME_MS)
+        self.animate_moves = controller.ANIMATION_FRAMES > 0
+
         # Initialise the time variable
         self.runtime = None
 
-        # Generate the grid matrix (matrix of values)
-        self.main_grid_values = [
-            [0] * self.TILES_PER_ROW for _ in range(self.TILES_PER_ROW)
-        ]
+        # The game model - holds the matrix, score and spawn generator
+        self.engine = GameEngine(self.TILES_PER_ROW)
+
+        # The save slot of this game (a new game gets a new slot)
+        self.set_slot(slot)
 
         # Initiate by spawning 2 two's and rendering the frame
-        self.add_two()
-        self.add_two()
+        self.engine.new_game()
         self.update_grid()
 
+        # Every game is logged move by move, so it can be replayed
+        # (a loaded game carries on its own log, see load_game)
+        self.move_log = None
+        self.replay = None
+        if new_game:
+            self.start_move_log()
+
         # Add the score text
         self.score_text = tk.Label(
             self, text='SCORE:', font=controller.BUTTON_FONT)
@@ -840,6 +1203,17 @@ class MainGame(tk.Frame):
             self.score_value_label.winfo_reqheight() -
             30)
 
+        # Add the save status - shown if the last save could not be written
+        # (the autosave thread's error is checked every SAVE_CHECK_MS)
+        self.SAVE_CHECK_MS = 1000
+        self.save_error_label = tk.Label(
+            self, font=controller.DESCRIPTION_FONT, fg='red')
+        self.save_error_label.place(
+            x=30,
+            y=controller.GAME_HEIGHT - self.score_text.winfo_reqheight() -
+            self.save_error_label.winfo_reqheight() - 35)
+        self.after(self.SAVE_CHECK_MS, self.check_save_error)
+
         # Add the back button
         self.back_button = tk.Button(
             self,
@@ -863,6 +1237,29 @@ class MainGame(tk.Frame):
             - 30 - self.back_button.winfo_reqwidth(),
             y=controller.GAME_HEIGHT - self.save_button.winfo_reqheight() - 20)
 
+        # Add the undo button (or press Ctrl+Z)
+        self.undo_button = tk.Button(
+            self,
+            text='Undo',
+            font=controller.DESCRIPTION_FONT,
+            command=self.undo)
+        self.undo_button.place(
+            x=controller.GAME_WIDTH - self.undo_button.winfo_reqwidth()
+            - self.save_button.winfo_reqwidth()
+            - 40 - self.back_button.winfo_reqwidth(),
+            y=controller.GAME_HEIGHT - self.undo_button.winfo_reqheight() - 20)
+        self.bind('<Control-z>', lambda event: self.undo())
+
+        # Moves from key presses, waiting to be applied on the next frame
+        self.input_queue = collections.deque()
+        self.input_after_id = None
+        self.game_over = False
+
+        # The AI player is created when A is first pressed
+        self.ai = None
+        self.ai_running = False
+        self.pending_move = None
+
         # Initialise name and prediction value
         self.name = ''
         self.predicted_value = -1
@@ -1035,16 +1432,55 @@ class MainGame(tk.Frame):
 
         self.runtime = time.time()
 
+    @property
+    def main_grid_values(self):
+        """The game matrix, owned by the game engine"""
+        return self.engine.grid
+
+    @main_grid_values.setter
+    def main_grid_values(self, matrix):
+        self.engine.grid = matrix
+
     def load_game(self):
-        """Load the game file, and start the game"""
+        """
+        Load the game file, and start the game
+        (a missing or damaged save starts a new game instead)
+        """
+        # Let any autosave still being written finish first
+        self.controller.autosaver.flush(
+            self.controller.AUTOSAVE_FLUSH_SECONDS)
+        try:
+            data = read_save(self.save_path)
+        except SaveError:
+            data = None
 
-        with open('2048save.json', 'r') as f:
-            data = json.load(f)
+        if data is None:
+            self.start_move_log()
+        else:
             self.main_grid_values = data['game_matrix']
+            self.engine.score = int(data['score'])
             self.score_value.set(str(data['score']))
             self.predicted_value = data['predicted_score']
             self.name = str(data['name'])
 
+            # Resume the spawn generator, so the game carries on with the
+            # same spawns (older saves have no seed and get a fresh one)
+            if 'seed' in data:
+                self.engine.rng = SpawnRNG(data['seed'])
+                self.engine.rng.setstate(data['rng_state'])
+
+            # Carry on the game's move log from where it was saved
+            # (older saves have no log, and a log which no longer matches
+            # the save, or a board past 32768, can't be carried on,
+            # so they are not logged)
+            if os.path.exists(data.get('log_path', '')) and \
+                    can_log(self.main_grid_values):
+                try:
+                    self.move_log = MoveLog.resume(
+                        data['log_path'], data['log_records'])
+                except (OSError, ValueError):
+                    self.move_log = None
+
         self.update_grid()
 
         self.bind(
@@ -1066,238 +1502,181 @@ class MainGame(tk.Frame):
         self.bind(
             '<a>', self.run_ai)
 
-    def save_game(self):
-        """Save the game matrix into 2048save.json - overwriting last save"""
+    def set_slot(self, slot=None):
+        """Sets the save slot the game is saved in, or a new one if None"""
+        if slot is None:
+            slot = self.controller.save_slots.new_slot_id()
 
-        with open('2048save.json', 'w+') as f:
-            results = {
-                'game_matrix': self.main_grid_values,
-                'score': self.score_value.get(),
-                'name': self.name,
-                'predicted_score': self.predicted_value
-            }
-            json.dump(results, f)
+        self.slot = slot
+        self.save_path = self.controller.save_slots.slot_path(slot)
 
-    def update_grid(self):
+    def destroy(self):
         """
-        Redraws the game grid,
-        using the matrix: self.main_grid_values
+        Writes the game's pending autosave straight away and closes its
+        move log, as it is left (and reports the animation frames dropped,
+        with --startup-times)
         """
+        self.controller.autosaver.hurry()
+        self.close_move_log()
 
-        def rgb_color(rgb):
-            """RGB to HEX"""
-            return '#%02x%02x%02x' % rgb
-
-        # Clear the on widgets preexisting on frame
-        for widget in self.main_grid.winfo_children():
-            widget.destroy()
-
-        BORDER_WIDTH = 8
-
-        # Draw the tiles.
-        for i in range(len(self.main_grid_values)):
-            for j in range(len(self.main_grid_values[i])):
-                # If the tile is 0: it must be blank,
-                # Therefore, render a blank grey tile.
-                if self.main_grid_values[i][j] == 0:
-                    tile = tk.Label(
-                        self.main_grid,
-                        text='',
-                        font=('Arial', 18),
-                        bg=rgb_color((210, 210, 210)))
-
-                # Otherwise, it must be non-empty and therefore,
-                # We add the number into the label - and color it accordingly
-                else:
-                    number = int(self.main_grid_values[i][j])
-                    tile = tk.Label(
-                        self.main_grid,
-                        bg=self.controller.TILE_COLORS[number],
-                        fg=self.controller.LABEL_COLORS[number],
-                        text=self.main_grid_values[i][j],
-                        font=('Arial', 20)
-                    )
+        if '--startup-times' in sys.argv:
+            print('{:<16}{frames_drawn:8} drawn, {dropped_frames} dropped'
+                  .format('tile frames', **self.animator.stats()))
+        tk.Frame.destroy(self)
 
-                # Border configuration
-                # This is so that no borders are overlapping
-                if j == len(self.main_grid_values) - \
-                        1 and i == len(self.main_grid_values) - 1:
-                    tile.grid(
-                        row=i,
-                        column=j,
-                        padx=BORDER_WIDTH,
-                        pady=BORDER_WIDTH,
-                        sticky='news')
-
-                elif j == len(self.main_grid_values) - 1:
-                    tile.grid(
-                        row=i, column=j, padx=BORDER_WIDTH, pady=(
-                            BORDER_WIDTH, 0), sticky='news')
-
-                elif i == len(self.main_grid_values) - 1:
-                    tile.grid(
-                        row=i,
-                        column=j,
-                        padx=(
-                            BORDER_WIDTH,
-                            0),
-                        pady=BORDER_WIDTH,
-                        sticky='news')
-
-                else:
-                    tile.grid(
-                        row=i, column=j, padx=(
-                            BORDER_WIDTH, 0), pady=(
-                            BORDER_WIDTH, 0), sticky='news')
-
-    def add_two(self):
+    def save_game(self):
         """
-        Adds a randomly placed two or four onto the game matrix,
-        P(x=2) = 0.75,
-        P(x=4) = 0.25
+        Save the game into the save file - overwriting last save
+        (written on the autosave thread, see savefile.write_save - the old
+        save is only replaced once the new one is safely written)
         """
+        self.controller.autosaver.save(
+            self.save_path, self.game_state())
 
-        i = random.randint(0, self.TILES_PER_ROW - 1)
-        j = random.randint(0, self.TILES_PER_ROW - 1)
-
-        # Regenerate positions until empty one is found
-        # This doesn't create an infinite loop,
-        # As matrix has GUARANTEE of possible move
-        while self.main_grid_values[i][j] != 0:
-            i = random.randint(0, self.TILES_PER_ROW - 1)
-            j = random.randint(0, self.TILES_PER_ROW - 1)
-
-        self.main_grid_values[i][j] = random.choice([2, 2, 2, 4])
-
-    def stack(self):
+    def check_save_error(self):
         """
-        Stacks all tiles to the LEFT (removes 0 tiles in between)
-        e.g
-
-        2 0 2 0                     2 2 0 0
-        0 0 2 0        ---->        2 0 0 2
-        2 0 0 2     stack left      2 2 0 0
-        0 2 2 0                     2 2 0 0
-
-        Note, it does NOT merge the tiles. This is in self.merge()
+        Shows the error of the last autosave (or Save click) if it could
+        not be written, and hides it once a save is written again
         """
+        if not self.winfo_exists():
+            return
 
-        # Create temporary matrix
-        temp_matrix = [
-            [0] *
-            self.TILES_PER_ROW for _ in range(
-                self.TILES_PER_ROW)]
+        error = self.controller.autosaver.error
+        if error is None:
+            self.save_error_label['text'] = ''
+        else:
+            self.save_error_label['text'] = 'Could not save: {}'.format(
+                getattr(error, 'strerror', None) or error)
+
+        self.after(self.SAVE_CHECK_MS, self.check_save_error)
+
+    def game_state(self):
+        """Returns everything needed to save the game, as a dict"""
+        results = {
+            'game_matrix': [row[:] for row in self.main_grid_values],
+            'score': self.engine.score,
+            'name': self.name,
+            'predicted_score': self.predicted_value,
+            'seed': self.engine.seed,
+            'rng_state': self.engine.rng.getstate()
+        }
+        if self.move_log is not None:
+            results['log_path'] = self.move_log.path
+            results['log_records'] = self.move_log.records
 
-        for i in range(len(self.main_grid_values)):
-            # Empty spot maintains the optimal position for the tile
-            empty_spot = 0
-            for j in range(len(self.main_grid_values)):
-                # If non zero, copy into optimal position into temporary matrix
-                # And increment the optimal position (as its full now)
-                if self.main_grid_values[i][j] != 0:
-                    temp_matrix[i][empty_spot] = self.main_grid_values[i][j]
-                    empty_spot += 1
+        return results
 
-        # Copy temporary matrix to real matrix
-        self.main_grid_values = temp_matrix
+    def start_move_log(self):
+        """Starts logging a new game to its own file in the logs folder"""
+        self.close_move_log()
 
-    def merge(self):
-        """
-        Merges all adjacent congruent tiles in a LEFT-wards direction
+        os.makedirs(self.controller.LOG_DIRECTORY, exist_ok=True)
+        path = os.path.join(
+            self.controller.LOG_DIRECTORY,
+            '{}-{:016x}.2048log'.format(
+                time.strftime('%Y%m%d-%H%M%S'), self.engine.seed))
 
-        2 2 0 0                     4 0 0 0
-        2 0 0 0       ---->         2 0 0 0
-        2 2 0 0     stack left      4 0 0 0
-        2 2 0 0                     4 0 0 0
+        self.move_log = MoveLog.create(path, self.engine.seed)
+        self.move_log.place_all(self.main_grid_values)
 
+    def close_move_log(self):
         """
-        for i in range(len(self.main_grid_values)):
-            for j in range(len(self.main_grid_values) - 1):
-                # If adjacent tiles are equal,
-                # Merge them into the leftwards term
-                value = self.main_grid_values[i][j]
-                right_adjacent_value = self.main_grid_values[i][j + 1]
-                if value == right_adjacent_value:
-                    self.score_value.set(
-                        str(int(self.score_value.get()) + value * 2))
-                    self.main_grid_values[i][j] *= 2
-                    self.main_grid_values[i][j + 1] = 0
-
-    def transpose(self):
+        Closes the game's move log, writing its snapshot index - or deletes
+        it if no move was made (e.g. the player went straight back)
         """
-        Transposes the game matrix
+        if self.move_log is None:
+            return
 
-        where if F(X, Y) = item in row X, column Y is mapped to F(Y, X)
-        F(X, Y) --> F(Y, X)
+        self.move_log.close()
+        if not self.move_log.has_moves():
+            try:
+                os.remove(self.move_log.path)
+            except OSError:
+                pass
+        self.move_log = None
 
-        The geometric equivalent of a matrix transposition,
-        is a 90 degree counter-clock wise rotation / mirror with line Y = X
+    def stop_move_log(self):
         """
+        Closes the move log and stops logging the game, once it makes a
+        tile the log can't replay (see movelog.can_log) - so the game can
+        no longer be undone or replayed
+        """
+        self.move_log.close()
+        self.move_log = None
+        self.undo_button['state'] = tk.DISABLED
 
-        temp_matrix = [
-            [0] *
-            self.TILES_PER_ROW for _ in range(self.TILES_PER_ROW)]
-        for i in range(len(self.main_grid_values)):
-            for j in range(len(self.main_grid_values)):
-                temp_matrix[j][i] = self.main_grid_values[i][j]
-
-        self.main_grid_values = temp_matrix
-
-    def reverse(self):
+    def create_tiles(self):
         """
-        Reverses the game matrix in horizontal direction
+        Creates a rectangle and a text item on the grid canvas for every
+        tile, which update_grid reconfigures as the values change
         """
 
-        temp_matrix = [
-            [0] *
-            self.TILES_PER_ROW for _ in range(
-                self.TILES_PER_ROW)]
-        for i in range(len(self.main_grid_values)):
-            for j in range(len(self.main_grid_values)):
-                temp_matrix[i][self.TILES_PER_ROW -
-                               1 - j] = self.main_grid_values[i][j]
-
-        self.main_grid_values = temp_matrix
+        # Gap between tiles, and the size of each tile (pixels)
+        self.TILE_GAP = 8
+        self.TILE_SIZE = (self.GRID_WIDTH - self.TILE_GAP *
+                          (self.TILES_PER_ROW + 1)) // self.TILES_PER_ROW
 
-    def any_empty_tiles(self):
-        """
-        Returns False if NO tiles remaining
-        Returns True if empty tiles exist
-        """
+        self.tile_rectangles = []
+        self.tile_texts = []
         for i in range(self.TILES_PER_ROW):
+            rectangles = []
+            texts = []
             for j in range(self.TILES_PER_ROW):
-                if self.main_grid_values[i][j] == 0:
-                    return True
+                x, y = self.cell_position(i, j)
 
-        return False
+                rectangles.append(self.main_grid.create_rectangle(
+                    x, y, x + self.TILE_SIZE, y + self.TILE_SIZE, width=0))
+                texts.append(self.main_grid.create_text(
+                    x + self.TILE_SIZE // 2, y + self.TILE_SIZE // 2))
 
-    def any_possible_moves_horizontal(self):
-        """
-        Returns False if NO merges possible left to right
-        Returns True if merges possible on the horizontal
-        """
-        for i in range(self.TILES_PER_ROW):
-            for j in range(self.TILES_PER_ROW - 1):
-                value = self.main_grid_values[i][j]
-                right_adjacent_value = self.main_grid_values[i][j + 1]
-                if value == right_adjacent_value:
-                    return True
+            self.tile_rectangles.append(rectangles)
+            self.tile_texts.append(texts)
 
-        return False
+        # The values currently drawn on each tile (None = never drawn)
+        self.drawn_values = [
+            [None] * self.TILES_PER_ROW for _ in range(self.TILES_PER_ROW)
+        ]
 
-    def any_possible_moves_vertical(self):
+    def cell_position(self, i, j):
+        """Returns the (x, y) canvas position of the top left of tile (i, j)"""
+        return (self.TILE_GAP + j * (self.TILE_SIZE + self.TILE_GAP),
+                self.TILE_GAP + i * (self.TILE_SIZE + self.TILE_GAP))
+
+    def update_grid(self, matrix=None):
         """
-        Returns False if NO merges possible up and down
-        Returns True if merges possible on the vertical axis
+        Redraws the game grid,
+        using the matrix: self.main_grid_values (or the matrix given)
+
+        Only the tiles whose value changed since the last redraw
+        are reconfigured.
         """
-        for i in range(self.TILES_PER_ROW - 1):
+        if matrix is None:
+            matrix = self.main_grid_values
+
+        for i in range(self.TILES_PER_ROW):
             for j in range(self.TILES_PER_ROW):
-                value = self.main_grid_values[i][j]
-                down_adjacent_value = self.main_grid_values[i + 1][j]
-                if value == down_adjacent_value:
-                    return True
+                number = int(matrix[i][j])
+                if number == self.drawn_values[i][j]:
+                    continue
 
-        return False
+                background, foreground, font = \
+                    self.controller.TILE_STYLES[number]
+                self.main_grid.itemconfigure(
+                    self.tile_rectangles[i][j], fill=background)
+
+                # If the tile is 0: it must be blank,
+                # Otherwise, we add the number into the tile
+                if number == 0:
+                    self.main_grid.itemconfigure(
+                        self.tile_texts[i][j], text='')
+                else:
+                    self.main_grid.itemconfigure(
+                        self.tile_texts[i][j],
+                        text=str(number),
+                        fill=foreground,
+                        font=font)
+
+                self.drawn_values[i][j] = number
 
     def is_game_finished(self):
         """
@@ -1305,9 +1684,8 @@ class MainGame(tk.Frame):
             if not, do nothing
             otherwise, it is, and UNBIND controls, and DISPLAY GAME OVER
         """
-        if not self.any_possible_moves_horizontal() and \
-                not self.any_possible_moves_vertical() and \
-                not self.any_empty_tiles():
+        if not self.game_over and self.engine.is_game_over():
+            self.game_over = True
 
             # Create frame
             self.game_over_frame = tk.Frame(
@@ -1369,11 +1747,19 @@ class MainGame(tk.Frame):
             )
             game_over_restart_button.grid(row=2, sticky='we', pady=(10, 0))
 
+            # Display the replay button, if the game was logged
+            if self.move_log is not None:
+                self.move_log.close()
+                game_over_replay_button = tk.Button(
+                    self.game_over_frame,
+                    font=self.controller.DESCRIPTION_FONT,
+                    text='Watch Replay',
+                    command=self.start_replay
+                )
+                game_over_replay_button.grid(row=3, sticky='we', pady=(10, 0))
+
             # Show the game over frame
-            self.game_over_frame.place(
-                x=self.game_over_frame.winfo_reqwidth() + 130,
-                y=self.game_over_frame.winfo_reqheight() + 80
-            )
+            self.place_game_over_frame()
 
             # Unbind the controls - so the user can't play anymore
             self.unbind('<{}>'.format(self.controller.slide_left_control))
@@ -1382,30 +1768,54 @@ class MainGame(tk.Frame):
             self.unbind('<{}>'.format(self.controller.slide_down_control))
 
             # Save this entry as a highscore
-            with open('2048highscores.json', 'r') as f:
-                try:
-                    data = json.load(f)
-                except Exception:
-                    data = json.loads('[]')
-
-                p_int = int(self.score_value.get()) - int(self.predicted_value)
-                data.append({
-                    'name': self.name,
-                    'score': int(self.score_value.get()),
-                    'prediction': p_int,
-                    'score / s': score_second
-                })
-
-            with open('2048highscores.json', 'w') as f:
-                json.dump(data, f)
+            p_int = int(self.score_value.get()) - int(self.predicted_value)
+            self.controller.get_score_store().add(
+                self.name,
+                int(self.score_value.get()),
+                p_int,
+                score_second)
 
             # Clear the save file
-            with open('2048save.json', 'w+') as f:
-                pass
+            self.controller.autosaver.clear(self.save_path)
 
             # Grey out the save button (as you can't save if you've lost :O)
             self.save_button['state'] = tk.DISABLED
             self.save_button['bg'] = '#cccccc'
+            self.undo_button['state'] = tk.DISABLED
+
+    def place_game_over_frame(self):
+        """Shows the game over frame on top of the board"""
+        self.game_over_frame.place(
+            x=self.game_over_frame.winfo_reqwidth() + 130,
+            y=self.game_over_frame.winfo_reqheight() + 80
+        )
+
+    def start_replay(self):
+        """
+        Plays the finished game back from its move log,
+        hiding the game over frame until the replay ends
+        """
+        self.replay = Replay(self.move_log.path)
+        self.game_over_frame.place_forget()
+        self.replay_step(0)
+
+    def replay_step(self, n):
+        """Shows the board after the first n records of the replay"""
+        if not self.winfo_exists() or self.replay is None:
+            return
+
+        board, score = self.replay.board_at(n)
+        self.main_grid_values = bitboard.to_matrix(board)
+        self.score_value.set(str(score))
+        self.update_grid()
+
+        if n < len(self.replay):
+            self.controller.after(
+                self.controller.REPLAY_STEP_MS,
+                lambda: self.replay_step(n + 1))
+        else:
+            self.replay = None
+            self.place_game_over_frame()
 
     def restart(self):
         """
@@ -1417,17 +1827,21 @@ class MainGame(tk.Frame):
         redraw board
         """
 
-        # Clear matrix
-        self.main_grid_values = [
-            [0] * self.TILES_PER_ROW for _ in range(self.TILES_PER_ROW)
-        ]
-
-        # Reset score and add new twos to board
+        # Clear matrix, reset score and add new twos to board,
+        # with a newly seeded spawn generator and save slot for the new game
+        self.game_over = False
+        self.set_slot()
+        self.input_queue.clear()
+        self.animate_moves = self.controller.ANIMATION_FRAMES > 0
+        self.engine.rng = SpawnRNG()
+        self.engine.new_game()
         self.score_value.set('0')
-        self.add_two()
-        self.add_two()
         self.update_grid()
 
+        # Stop any replay, and log the new game
+        self.replay = None
+        self.start_move_log()
+
         # Rebind keys
         self.bind(
             '<{}>'.format(
@@ -1456,118 +1870,210 @@ class MainGame(tk.Frame):
         self.save_button['state'] = tk.NORMAL
         self.save_button['bg'] = 'blue'
         self.save_button['fg'] = 'white'
+        self.undo_button['state'] = tk.NORMAL
 
         # Restart time
         self.time = time.time()
 
-    def push_left(self, event):
-        """Swipe tiles left"""
-        pre_matrix = self.main_grid_values
+    def queue_move(self, direction):
+        """
+        Queues a move from a key press.
+        Queued moves are applied together once per frame, so holding a key
+        down never leaves the window redrawing a backlog of moves.
+        """
+        self.input_queue.append(direction)
+        if self.input_after_id is None:
+            self.input_after_id = self.controller.after(
+                self.controller.INPUT_FRAME_MS, self.process_input)
+
+    def process_input(self):
+        """Applies every queued move, then draws the result once"""
+        self.input_after_id = None
+        if not self.winfo_exists():
+            return
 
-        self.stack()
-        self.merge()
+        directions = list(self.input_queue)
+        self.input_queue.clear()
+        self.apply_moves(directions)
 
-        if self.any_empty_tiles() and pre_matrix != self.main_grid_values:
-            self.add_two()
+    def apply_moves(self, directions):
+        """
+        Swipes the tiles in each of the given directions on the game engine,
+        then redraws the board once and checks for game over.
+
+        Returns True if the board changed
+        """
+        changed_moves = []
+        for direction in directions:
+            # Ignore the rest of the batch once the game is lost
+            if self.engine.is_game_over():
+                break
+
+            # The engine changes the matrix in place, so keep a copy
+            pre_matrix = [row[:] for row in self.main_grid_values]
+            if self.engine.move(direction):
+                changed_moves.append((pre_matrix, direction))
+                if self.move_log is not None:
+                    if can_log(self.main_grid_values):
+                        self.move_log.record(
+                            direction, self.engine.last_spawn)
+                    else:
+                        self.stop_move_log()
+
+        self.score_value.set(str(self.engine.score))
+
+        # Mark the save dirty (the autosave thread writes it later)
+        if changed_moves:
+            self.controller.autosaver.update(
+                self.save_path, self.game_state())
+
+        # Slide the tiles into place if there was a single move,
+        # otherwise just draw the final board
+        if len(changed_moves) == 1 and self.animate_moves:
+            pre_matrix, direction = changed_moves[0]
+            self.animator.animate(
+                slide_trajectories(pre_matrix, direction),
+                on_finish=self.update_grid)
+        else:
+            self.animator.finish()
+            self.update_grid()
 
-        self.update_grid()
         self.is_game_finished()
 
-    def push_up(self, event):
-        """Swipe tiles up"""
-        pre_matrix = self.main_grid_values
+        return len(changed_moves) > 0
 
-        self.transpose()
-        self.stack()
-        self.merge()
-        self.transpose()
+    def undo(self):
+        """
+        Takes back the last move, rebuilding the board from the move log
+        (at most one snapshot interval of moves is replayed)
+        """
+        if self.game_over or self.ai_running or self.replay is not None:
+            return
+        if self.move_log is None or not self.move_log.can_undo():
+            return
+
+        # Drop any moves still waiting to be applied
+        self.input_queue.clear()
+        self.animator.finish()
 
-        if self.any_empty_tiles() and pre_matrix != self.main_grid_values:
-            self.add_two()
+        board, score = self.move_log.undo()
+        self.main_grid_values = bitboard.to_matrix(board)
+        self.engine.score = score
 
+        # Take back the move's spawn too, so playing the same move again
+        # spawns the same tile (undo is not a re-roll)
+        self.engine.rng.rewind(DRAWS_PER_SPAWN)
+        self.score_value.set(str(score))
         self.update_grid()
-        self.is_game_finished()
+        self.controller.autosaver.update(
+            self.save_path, self.game_state())
 
-    def push_right(self, event):
-        """Swipe tiles right"""
-        pre_matrix = self.main_grid_values
+    def make_move(self, direction):
+        """Plays a single move straight away (see apply_moves)"""
+        return self.apply_moves([direction])
 
-        self.reverse()
-        self.stack()
-        self.merge()
-        self.reverse()
+    def push_left(self, event):
+        """Swipe tiles left"""
+        self.queue_move('left')
 
-        if self.any_empty_tiles() and pre_matrix != self.main_grid_values:
-            self.add_two()
+    def push_up(self, event):
+        """Swipe tiles up"""
+        self.queue_move('up')
 
-        self.update_grid()
-        self.is_game_finished()
+    def push_right(self, event):
+        """Swipe tiles right"""
+        self.queue_move('right')
 
     def push_down(self, event):
         """Swipe tiles down"""
-        pre_matrix = self.main_grid_values
+        self.queue_move('down')
 
-        self.transpose()
-        self.reverse()
-        self.stack()
-        self.merge()
-        self.reverse()
-        self.transpose()
-
-        if self.any_empty_tiles() and pre_matrix != self.main_grid_values:
-            self.add_two()
-
-        self.update_grid()
-        self.is_game_finished()
-
-    def run_ai(self, event, move='right'):
+    def run_ai(self, event):
         """
-        Bonus rudimentary AI included:
+        Bonus expectimax AI included:
 
         press A to run
         """
 
-        # If the game is done, climb and exit call stack
-        if not self.any_possible_moves_horizontal() and \
-                not self.any_possible_moves_vertical() and \
-                not self.any_empty_tiles():
+        # Only one AI loop may run at a time, and not once the game is over
+        if self.ai_running or self.game_over:
             return
 
-        # Copy the matrix
-        copy_matrix = self.main_grid_values
+        # The AI is built on first use, as it precomputes its tables
+        # With several cores, each move is searched in its own process
+        if self.ai is None:
+            if self.controller.AI_PROCESSES > 1:
+                self.ai = self.controller.get_parallel_ai()
+            else:
+                self.ai = ExpectimaxAI(time_limit=0.04)
 
-        # Choose control
-        next_move = None
-        if move == 'right':
-            self.push_right('a')
-            next_move = 'down'
+        # Autoplay draws each move instantly (stop_ai turns animation back on)
+        self.ai_running = True
+        self.animate_moves = False
+        self.ai_step()
 
-        elif move == 'down':
-            self.push_down('a')
-            next_move = 'right'
+    def ai_step(self):
+        """Plays one AI move, then schedules the next one"""
 
-        elif move == 'left':
-            self.push_left('a')
-            next_move = 'right'
+        # If the frame is gone or the game is done, stop the AI
+        if not self.winfo_exists() or self.engine.is_game_over():
+            self.stop_ai()
+            return
 
-        elif move == 'up':
-            self.push_up('a')
-            next_move = 'down'
+        # Start searching for the best move
+        board = bitboard.from_matrix(self.main_grid_values)
+        try:
+            self.pending_move = self.ai.submit(board)
+        except Exception:
+            self.ai_failed()
+            return
+        self.poll_ai()
 
-        # No changes
-        if self.main_grid_values == copy_matrix:
-            if move == 'down':
-                next_move = 'right'
+    def poll_ai(self):
+        """
+        Checks whether the AI has chosen its move yet;
+        if so, plays it, otherwise checks again shortly.
+        This keeps the window responsive while the search runs.
+        """
+        if not self.winfo_exists():
+            self.stop_ai()
+            return
 
-            elif move == 'right':
-                next_move = 'left'
+        if not self.pending_move.done():
+            self.controller.after(5, self.poll_ai)
+            return
 
-            elif move == 'left':
-                next_move = 'up'
+        try:
+            move = self.pending_move.result()
+        except Exception:
+            self.ai_failed()
+            return
 
-        # Draw grid and call next recursive call
-        self.update_grid()
-        self.controller.after(50, lambda: self.run_ai('a', move=next_move))
+        if move is None:
+            self.stop_ai()
+            return
+
+        self.make_move(move)
+        self.controller.after(50, self.ai_step)
+
+    def stop_ai(self):
+        """Ends the AI loop, turning the tile animation back on"""
+        self.ai_running = False
+        self.animate_moves = self.controller.ANIMATION_FRAMES > 0
+
+    def ai_failed(self):
+        """
+        Stops the AI after its search failed (e.g. a worker process died,
+        breaking the process pool). The next run uses the single process AI,
+        and the broken workers are shut down, so a new game starts afresh
+        """
+        self.stop_ai()
+        self.pending_move = None
+
+        if self.ai is self.controller.parallel_ai:
+            self.controller.parallel_ai = None
+            self.ai.shutdown()
+        self.ai = ExpectimaxAI(time_limit=0.04)
 
 
 class HighScores(tk.Frame):
@@ -1676,20 +2182,18 @@ class HighScores(tk.Frame):
             back_button_instructions.winfo_reqheight() -
             30)
 
-        # The START and FINISH pointers that the program will render between
-        # from text_matrix
+        # The START and FINISH pointers (ranks) of the page shown
+        self.ROWS_PER_PAGE = 4
         self.a = 0
-        self.b = 4
+        self.b = self.ROWS_PER_PAGE
 
-        # Matrix (2d-array) that holds the values of the scoreboard
+        # Matrix (2d-array) that holds the rows of the current page
         # Must be initialised by self.load_textmatrix
         self.text_matrix = []
 
-        # Load the high score matrix,
-        # Sort it via score,
-        # Draw it
-        self.load_textmatrix()
-        self.update_textmatrix_score()
+        # The high score store, and the ranking shown (see SORT_ORDERS)
+        self.store = controller.get_score_store()
+        self.sort = 'score'
 
         # Displays next page and previous page buttons
         self.previous_page = tk.Button(
@@ -1754,13 +2258,26 @@ class HighScores(tk.Frame):
             y=self.previous_page.winfo_reqheight() + 572
         )
 
+        # Build the table,
+        # Load the first page, sorted via score,
+        # Draw it
+        self.create_table()
+        self.update_textmatrix_score()
+
+    def refresh(self):
+        """
+        Shows the first page sorted by score again,
+        picking up any games finished since the frame was built
+        """
+        self.update_textmatrix_score()
+
     def display_background(self, image_path):
         """
         Given a relative path to an image (any image format),
         the image is drawn on frame canvas.
+        (the image is decoded once, and shared by every frame)
         """
-        background_image = Image.open(image_path)
-        self.canvas.image = ImageTk.PhotoImage(background_image)
+        self.canvas.image = self.controller.images.photo(image_path)
         self.canvas.create_image((0, 0), image=self.canvas.image, anchor='nw')
 
     def display_object_on_canvas(self, tk_object, x, y):
@@ -1776,14 +2293,14 @@ class HighScores(tk.Frame):
             anchor='nw',
             window=tk_object)
 
-    def update_scoreboard(self):
-        """Clears and draws the high score table from self.text_matrix"""
+    def create_table(self):
+        """
+        Builds the high score table once: a title row,
+        and a row of (initially blank) labels for each row of a page.
 
-        # clear board if not cleared.
-        try:
-            self.table_4x5.destroy()
-        except Exception:
-            pass
+        Changing page or sort order only rewrites the label texts
+        (see update_scoreboard), it never rebuilds the widgets.
+        """
 
         # create frame
         self.table_border_width = 2
@@ -1793,75 +2310,21 @@ class HighScores(tk.Frame):
             width=640,
             height=220,
             bg=self.table_border_color)
-        self.table_4x5.grid_columnconfigure(0, weight=1)
-        self.table_4x5.grid_columnconfigure(1, weight=1)
-        self.table_4x5.grid_columnconfigure(2, weight=1)
-        self.table_4x5.grid_columnconfigure(3, weight=1)
         self.table_4x5.grid_propagate(0)
 
-        # check self.textmatrix for emptiness, if so, fill them
-        if len(self.text_matrix) < 5:
-            J = 5 - len(self.text_matrix)
-            for iteration in range(J):
-                self.text_matrix.append(['' for i in range(5)])
-
         # set up columns
-        for i in range(0, 5):
-            self.table_4x5.grid_rowconfigure(i, weight=1)
+        for jndex in range(5):
+            self.table_4x5.grid_columnconfigure(jndex, weight=1)
+        for index in range(self.ROWS_PER_PAGE + 1):
+            self.table_4x5.grid_rowconfigure(index, weight=1)
 
-        # insert title labels
+        # Row 0 holds the title labels, the rows below hold the entries
         labels = ['Rank', 'Name', 'Score', 'Prediction', 'Score / second']
-        for jndex, text in enumerate(labels):
-            label = tk.Label(self.table_4x5, text=text)
-            label.config(
-                bg='white',
-                anchor=tk.W,
-                justify=tk.LEFT
-            )
-
-            if jndex == 4:
-                label.grid(
-                    row=0,
-                    column=jndex,
-                    sticky='news',
-                    pady=(self.table_border_width, self.table_border_width),
-                    padx=(self.table_border_width, self.table_border_width))
-
-            else:
-                label.grid(
-                    row=0,
-                    column=jndex,
-                    sticky='news',
-                    pady=(self.table_border_width, self.table_border_width),
-                    padx=(self.table_border_width, 0))
-
-        # column_index stores the column pointer for each entry.
-        # e.g column_index = 2 means read the NAME column for this entry.
-        column_index = 0
-        for index in range(self.a, self.b):
-            column_index += 1
-
-            # INDEX NOT EXIST:
-            # A boolean that allows for the loop to default to blank values
-            # Iff the matrix index doesnt exist.
-            index_not_exist = False
-
-            # Check to see if this index exists in text_matrix.
-            # If so, go ahead and draw,
-            # Else use blanks.
-            try:
-                if self.text_matrix[index][0] != '':
-                    self.text_matrix[index][0] = index + 1
-            except IndexError:
-                index_not_exist = True
-
-            # Grid the labels.
+        self.table_labels = []
+        for index in range(self.ROWS_PER_PAGE + 1):
+            row = []
             for jndex in range(5):
-                if index_not_exist:
-                    text = ''
-                else:
-                    text = self.text_matrix[index][jndex]
-
+                text = labels[jndex] if index == 0 else ''
                 label = tk.Label(self.table_4x5, text=text)
                 label.config(
                     bg='white',
@@ -1869,56 +2332,26 @@ class HighScores(tk.Frame):
                     justify=tk.LEFT
                 )
 
-                if jndex == 0:
+                # Ranks are right aligned
+                if index > 0 and jndex == 0:
                     label.config(justify=tk.RIGHT, anchor=tk.E)
 
-                if column_index == 0:
-                    if jndex == 4:
-                        label.grid(
-                            row=column_index,
-                            column=jndex,
-                            sticky='news',
-                            pady=(
-                                self.table_border_width,
-                                self.table_border_width),
-                            padx=(
-                                self.table_border_width,
-                                self.table_border_width)
-                        )
-
-                    else:
-                        label.grid(
-                            row=column_index,
-                            column=jndex,
-                            sticky='news',
-                            pady=(
-                                self.table_border_width,
-                                self.table_border_width),
-                            padx=(
-                                self.table_border_width,
-                                0)
-                        )
-
-                else:
-                    if jndex == 4:
-                        label.grid(
-                            row=column_index,
-                            column=jndex,
-                            sticky='news',
-                            pady=(
-                                0, self.table_border_width),
-                            padx=(
-                                self.table_border_width,
-                                self.table_border_width)
-                        )
+                # Borders: the title row has one above it too,
+                # and the last column one on its right
+                label.grid(
+                    row=index,
+                    column=jndex,
+                    sticky='news',
+                    pady=(
+                        self.table_border_width if index == 0 else 0,
+                        self.table_border_width),
+                    padx=(
+                        self.table_border_width,
+                        self.table_border_width if jndex == 4 else 0))
+                row.append(label)
 
-                    else:
-                        label.grid(
-                            row=column_index,
-                            column=jndex,
-                            sticky='news',
-                            pady=(0, self.table_border_width),
-                            padx=(self.table_border_width, 0))
+            if index > 0:
+                self.table_labels.append(row)
 
         # Display the packed table
         self.display_object_on_canvas(
@@ -1926,96 +2359,80 @@ class HighScores(tk.Frame):
             30,
             self.table_4x5.winfo_reqheight() + 150)
 
-    def load_textmatrix(self):
+    def update_scoreboard(self):
         """
-        This method reads from 2048highscores.json,
-        and copies values over to self.text_matrix
+        Writes the rows of self.text_matrix (the current page)
+        into the table, blanking rows past the last game
         """
+        for row, labels in enumerate(self.table_labels):
+            for jndex, label in enumerate(labels):
+                if row < len(self.text_matrix):
+                    text = self.text_matrix[row][jndex]
+                else:
+                    text = ''
 
-        # Load the file up
-        try:
-            f = open('2048highscores.json', 'r')
-            data = json.load(f)
+                # Only touch labels whose text changes
+                if label['text'] != str(text):
+                    label['text'] = text
 
-            # Append the values into the self.text_matrix variable
-            for index, entry in enumerate(data):
-                self.text_matrix.append([
-                    index + 1,
-                    entry['name'],
-                    entry['score'],
-                    entry['prediction'],
-                    entry['score / s']
-                ])
+    def load_textmatrix(self):
+        """
+        This method reads the rows of the current page (self.a to self.b)
+        from the high score store, in the current sort order,
+        and copies values over to self.text_matrix
+        """
+        entries = self.store.page(self.sort, self.b - self.a, self.a)
+        self.text_matrix = [
+            [
+                self.a + index + 1,
+                entry['name'],
+                entry['score'],
+                entry['prediction'],
+                entry['score / s']
+            ]
+            for index, entry in enumerate(entries)
+        ]
 
-        except Exception:
-            # If file blank, or file not existent, do nothing.
-            pass
+    def sort_textmatrix(self, sort):
+        """
+        Shows the first page of the table sorted by the given ranking
+        (see highscores.SORT_ORDERS), and redraws the table
+        """
+        self.sort = sort
+        self.a = 0
+        self.b = self.ROWS_PER_PAGE
+        self.page_number.set('1')
+        self.load_textmatrix()
+        self.update_scoreboard()
 
     def update_textmatrix_score(self):
-        """Sorts text_matrix and by highest score, and redraws the table"""
-        data = []
-        for line in self.text_matrix:
-            if not isinstance(line[0], type(0)):
-                continue
-            else:
-                data.append(line)
-
-        data.sort(reverse=True, key=lambda x: int(x[2]))
-        self.text_matrix = []
-        for line in data:
-            self.text_matrix.append(line)
-
-        self.update_scoreboard()
+        """Sorts the table by highest score, and redraws it"""
+        self.sort_textmatrix('score')
 
     def update_textmatrix_prediction(self):
         """
-        Sorts text_matrix and by smallest absolute prediction,
-        and redraws the table
+        Sorts the table by smallest absolute prediction,
+        and redraws it
         """
-        data = []
-        for line in self.text_matrix:
-            if not isinstance(line[0], type(0)):
-                continue
-            else:
-                data.append(line)
-
-        data.sort(key=lambda x: abs(int(x[3])))
-
-        self.text_matrix = []
-        for line in data:
-            self.text_matrix.append(line)
-
-        self.update_scoreboard()
+        self.sort_textmatrix('prediction')
 
     def update_textmatrix_scoresecond(self):
         """
-        Sorts text_matrix and by highest score second, and redraws the table
+        Sorts the table by highest score second, and redraws it
         """
-        data = []
-        for line in self.text_matrix:
-            if not isinstance(line[0], type(0)):
-                continue
-            else:
-                data.append(line)
-
-        data.sort(reverse=True, key=lambda x: int(x[4]))
-        self.text_matrix = []
-
-        for line in data:
-            self.text_matrix.append(line)
-
-        self.update_scoreboard()
+        self.sort_textmatrix('score / s')
 
     def next_page(self):
         """
         Increments the matrix pointers, and redraws the table accordingly
         """
-        if self.b >= len(self.text_matrix) or len(self.text_matrix) == 5:
+        if self.b >= self.store.count():
             return
 
         self.page_number.set(str(int(self.page_number.get()) + 1))
-        self.a += 4
-        self.b += 4
+        self.a += self.ROWS_PER_PAGE
+        self.b += self.ROWS_PER_PAGE
+        self.load_textmatrix()
         self.update_scoreboard()
 
     def previous_page(self):
@@ -2026,11 +2443,215 @@ class HighScores(tk.Frame):
             return
 
         self.page_number.set(str(int(self.page_number.get()) - 1))
-        self.a -= 4
-        self.b -= 4
+        self.a -= self.ROWS_PER_PAGE
+        self.b -= self.ROWS_PER_PAGE
+        self.load_textmatrix()
         self.update_scoreboard()
 
 
+class LoadGame(tk.Frame):
+    """
+    This class handles the load game page - a list of the save slots
+
+    Only the save slot index is read: each slot shows the player's name,
+    score, largest tile and when it was saved, and a thumbnail of the
+    board drawn from the index. A save is only read once it is loaded.
+    """
+
+    def __init__(self, parent, controller):
+        tk.Frame.__init__(
+            self,
+            parent,
+            width=controller.GAME_WIDTH,
+            height=controller.GAME_HEIGHT)
+        self.controller = controller
+
+        # List the slots, once any save still pending is written
+        controller.autosaver.flush(controller.AUTOSAVE_FLUSH_SECONDS)
+        self.slots = controller.save_slots.slots()
+
+        # Display the title
+        title_label = tk.Label(
+            self,
+            text='Load Game',
+            font=controller.TITLE_FONT)
+        title_label.place(x=30, y=30)
+
+        # THESE CONTROL THE SLOT ROWS (pixels)
+        self.ROWS_PER_PAGE = 5
+        self.THUMBNAIL_SIZE = 64
+        self.ROW_TOP = 110
+        self.ROW_HEIGHT = self.THUMBNAIL_SIZE + 24
+        self.page = 0
+
+        # Build the rows once: thumbnail, details, load and delete buttons
+        # (update_rows fills them in for the page shown)
+        self.rows = []
+        for index in range(self.ROWS_PER_PAGE):
+            row = tk.Frame(self)
+            thumbnail = tk.Canvas(
+                row,
+                width=self.THUMBNAIL_SIZE,
+                height=self.THUMBNAIL_SIZE,
+                bg='black',
+                highlightthickness=0)
+            thumbnail.grid(row=0, column=0, padx=(0, 10))
+
+            details = tk.Label(
+                row,
+                font=controller.DESCRIPTION_FONT,
+                width=40,
+                anchor=tk.W,
+                justify=tk.LEFT)
+            details.grid(row=0, column=1, sticky='w')
+
+            load_button = tk.Button(
+                row,
+                text='Load',
+                bg='blue',
+                fg='white',
+                font=controller.DESCRIPTION_FONT)
+            load_button.grid(row=0, column=2, padx=(10, 5))
+
+            delete_button = tk.Button(
+                row,
+                text='Delete',
+                font=controller.DESCRIPTION_FONT)
+            delete_button.grid(row=0, column=3)
+
+            self.rows.append(
+                (row, thumbnail, details, load_button, delete_button))
+
+        # Shown instead of the rows if there are no saves
+        self.empty_label = tk.Label(
+            self,
+            text='There are no saved games',
+            font=controller.BUTTON_FONT)
+
+        # Displays previous page, next page, page number and back buttons
+        previous_button = tk.Button(
+            self,
+            text='Previous',
+            font=controller.DESCRIPTION_FONT,
+            command=self.previous_page)
+        previous_button.place(
+            x=30,
+            y=controller.GAME_HEIGHT - previous_button.winfo_reqheight() - 30)
+
+        next_button = tk.Button(
+            self,
+            text='Next',
+            font=controller.DESCRIPTION_FONT,
+            command=self.next_page)
+        next_button.place(
+            x=40 + previous_button.winfo_reqwidth(),
+            y=controller.GAME_HEIGHT - next_button.winfo_reqheight() - 30)
+
+        self.page_number = tk.StringVar()
+        page_number_label = tk.Label(
+            self,
+            textvariable=self.page_number,
+            font=controller.BUTTON_FONT)
+        page_number_label.place(
+            x=60 + previous_button.winfo_reqwidth() +
+            next_button.winfo_reqwidth(),
+            y=controller.GAME_HEIGHT -
+            page_number_label.winfo_reqheight() - 30)
+
+        back_button = tk.Button(
+            self,
+            text='Back to menu',
+            font=controller.BUTTON_FONT,
+            command=lambda: controller.show_frame(MainMenu))
+        back_button.place(
+            x=controller.GAME_WIDTH - back_button.winfo_reqwidth() - 30,
+            y=controller.GAME_HEIGHT - back_button.winfo_reqheight() - 30)
+
+        self.update_rows()
+
+    def update_rows(self):
+        """Fills in the rows with the slots of the current page"""
+        first = self.page * self.ROWS_PER_PAGE
+        for index, widgets in enumerate(self.rows):
+            row, thumbnail, details, load_button, delete_button = widgets
+
+            # Hide rows past the last slot
+            if first + index >= len(self.slots):
+                row.place_forget()
+                continue
+
+            entry = self.slots[first + index]
+            self.draw_thumbnail(thumbnail, entry['board'])
+            details['text'] = '{}\nScore: {}    Largest tile: {}\n{}'.format(
+                entry['name'],
+                entry['score'],
+                entry['max_tile'],
+                time.strftime(
+                    'Saved %d %b %Y, %H:%M',
+                    time.localtime(entry['timestamp'])))
+            load_button['command'] = \
+                lambda slot=entry['id']: self.load_slot(slot)
+            delete_button['command'] = \
+                lambda slot=entry['id']: self.delete_slot(slot)
+            row.place(x=30, y=self.ROW_TOP + index * self.ROW_HEIGHT)
+
+        if self.slots:
+            self.empty_label.place_forget()
+        else:
+            self.empty_label.place(x=30, y=self.ROW_TOP)
+
+        pages = max(1, -(-len(self.slots) // self.ROWS_PER_PAGE))
+        self.page_number.set('Page: {} / {}'.format(self.page + 1, pages))
+
+    def draw_thumbnail(self, canvas, board):
+        """
+        Draws a board thumbnail from the index
+        (one hex digit per cell - the tile's exponent)
+        """
+        canvas.delete('all')
+        cell = self.THUMBNAIL_SIZE / 4
+        for index, digit in enumerate(board):
+            i, j = divmod(index, 4)
+            exponent = int(digit, 16)
+            value = 1 << exponent if exponent else 0
+            canvas.create_rectangle(
+                j * cell + 1,
+                i * cell + 1,
+                (j + 1) * cell - 1,
+                (i + 1) * cell - 1,
+                fill=self.controller.TILE_STYLES[value][0],
+                width=0)
+
+    def load_slot(self, slot):
+        """Loads the save in the slot, and starts the game"""
+        self.controller.show_frame(MainGame, new_game=False, slot=slot)
+
+    def delete_slot(self, slot):
+        """Deletes the save in the slot (on the autosave thread)"""
+        self.controller.autosaver.clear(
+            self.controller.save_slots.slot_path(slot))
+        self.controller.save_slots.forget(slot)
+        self.slots = [entry for entry in self.slots if entry['id'] != slot]
+
+        # Stay on the last page if this one is now empty
+        if self.page > 0 and \
+                self.page * self.ROWS_PER_PAGE >= len(self.slots):
+            self.page -= 1
+        self.update_rows()
+
+    def next_page(self):
+        """Shows the next page of slots, if there is one"""
+        if (self.page + 1) * self.ROWS_PER_PAGE < len(self.slots):
+            self.page += 1
+            self.update_rows()
+
+    def previous_page(self):
+        """Shows the previous page of slots, if there is one"""
+        if self.page > 0:
+            self.page -= 1
+            self.update_rows()
+
+
 if __name__ == '__main__':
     app = MainProgram()
     app.mainloop()
@@ -0,0 +1,346 @@
+"""
+Compact binary history of a game as it is played, and a replay engine.
+
+File layout:
+    header:     b'2048', format version (1 byte), seed (8 bytes),
+                then (version 2) the snapshot interval K (2 bytes)
+    records:    one byte per move (or starting tile)
+        bits 0-3    cell the new tile spawned in (4 * row + column)
+        bit 4       set if the new tile is a 4, otherwise it is a 2
+        bits 5-6    direction moved (index into DIRECTIONS)
+        bit 7       set for a starting tile, placed without a move
+    snapshots:  after every K records, a 0xE0 marker byte, the bitboard
+                (8 bytes) and the score (4 bytes)
+    index:      (version 2, written when the game is closed) the record
+                number and file offset of every snapshot (4 bytes each),
+                then the number of snapshots (4 bytes) and b'INDX'
+
+All numbers are little endian. Records and snapshots are only appended
+(or cut off by an undo), and flushed as they are written, so a game is
+kept even if the program stops mid-game - the index is then rebuilt by
+scanning. Any position is rebuilt from the snapshot before it, so undo
+and seeking cost at most K moves, however long the game.
+"""
+import bisect
+import struct
+
+import bitboard
+from game_engine import DIRECTIONS
+
+
+MAGIC = b'2048'
+VERSION = 2
+HEADER = struct.Struct('<4sBQ')
+INTERVAL = struct.Struct('<H')
+
+PLACEMENT = 0x80
+FOUR = 0x10
+
+SNAPSHOT_MARKER = 0xE0
+SNAPSHOT = struct.Struct('<BQI')
+INDEX_ENTRY = struct.Struct('<II')
+TRAILER = struct.Struct('<I4s')
+TRAILER_MAGIC = b'INDX'
+
+# Records between snapshots
+DEFAULT_INTERVAL = 64
+
+# Largest tile a log can be replayed with (see bitboard.MAX_EXPONENT)
+MAX_TILE = 1 << bitboard.MAX_EXPONENT
+
+
+def encode_record(direction, i, j, value):
+    """
+    Packs one record into a byte: the direction moved (None for a starting
+    tile) and the tile (2 or 4) which then spawned at row i, column j
+    """
+    if value not in (2, 4):
+        raise ValueError('Only 2 and 4 tiles can be logged, not {}'.format(
+            value))
+
+    record = 4 * i + j
+    if value == 4:
+        record |= FOUR
+    if direction is None:
+        record |= PLACEMENT
+    else:
+        record |= DIRECTIONS.index(direction) << 5
+
+    return record
+
+
+def can_log(matrix):
+    """
+    Returns True if a board can be rebuilt from a log - every tile is at
+    most MAX_TILE (bitboards can't merge two MAX_TILE tiles)
+    """
+    return all(value <= MAX_TILE for row in matrix for value in row)
+
+
+def decode_record(record):
+    """
+    Unpacks a record byte into (direction index or None, cell, exponent),
+    where cell is 4 * row + column and exponent is 1 (a 2) or 2 (a 4)
+    """
+    direction = None if record & PLACEMENT else (record >> 5) & 0x3
+    exponent = 2 if record & FOUR else 1
+    return direction, record & 0xF, exponent
+
+
+def apply_records(board, score, records):
+    """Plays records onto a (bitboard, score), returning the new pair"""
+    for record in records:
+        direction, cell, exponent = decode_record(record)
+        if direction is not None:
+            board, gained = bitboard.MOVES[direction](board)
+            score += gained
+        board |= exponent << (4 * cell)
+
+    return board, score
+
+
+def read_log(path):
+    """
+    Reads a log file, returning (seed, interval, records, snapshots):
+        records:    the record bytes, without the snapshots
+        snapshots:  (records before it, bitboard, score, file offset of the
+                    next record) for every snapshot, starting with the
+                    empty board before the first record
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    magic, version, seed = HEADER.unpack_from(data)
+    if magic != MAGIC or version not in (1, 2):
+        raise ValueError('{} is not a 2048 move log'.format(path))
+
+    start = HEADER.size
+    interval = 0
+    if version >= 2:
+        interval, = INTERVAL.unpack_from(data, start)
+        start += INTERVAL.size
+
+    snapshots = [(0, 0, 0, start)]
+    end = len(data)
+
+    # A closed log ends with the snapshot index
+    index = None
+    if version >= 2 and end - start >= TRAILER.size:
+        count, magic = TRAILER.unpack_from(data, end - TRAILER.size)
+        if magic == TRAILER_MAGIC:
+            end -= TRAILER.size + count * INDEX_ENTRY.size
+            index = [
+                INDEX_ENTRY.unpack_from(data, end + k * INDEX_ENTRY.size)
+                for k in range(count)
+            ]
+
+    if index is not None:
+        # Cut the records out from between the indexed snapshots
+        pieces = []
+        position = start
+        for number, offset in index:
+            pieces.append(data[position:offset])
+            marker, board, score = SNAPSHOT.unpack_from(data, offset)
+            position = offset + SNAPSHOT.size
+            snapshots.append((number, board, score, position))
+        pieces.append(data[position:end])
+        records = b''.join(pieces)
+
+    else:
+        # No index (the game was not closed): scan for the snapshots,
+        # ignoring a snapshot cut short at the end of the file
+        records = bytearray()
+        position = start
+        while position < end:
+            if data[position] == SNAPSHOT_MARKER:
+                if position + SNAPSHOT.size > end:
+                    break
+                marker, board, score = SNAPSHOT.unpack_from(data, position)
+                position += SNAPSHOT.size
+                snapshots.append((len(records), board, score, position))
+            else:
+                records.append(data[position])
+                position += 1
+        records = bytes(records)
+
+    return seed, interval, records, snapshots
+
+
+class MoveLog:
+    """
+    Writes the history of one game
+
+    Use MoveLog.create for a new game, or MoveLog.resume to carry on
+    a saved game's history. The current board and score are kept (as a
+    bitboard), so snapshots can be written, and moves taken back.
+    """
+
+    def __init__(self, path, file, seed, interval, records, snapshots):
+        self.path = path
+        self.file = file
+        self.seed = seed
+        self.interval = interval
+
+        # Every record so far, and the snapshots taken
+        self.data = bytearray(records)
+        self.snapshots = snapshots
+
+        # Rebuild the current position from the last snapshot
+        number, board, score, offset = snapshots[-1]
+        self.board, self.score = apply_records(board, score, records[number:])
+
+    @property
+    def records(self):
+        """Number of records written so far"""
+        return len(self.data)
+
+    @classmethod
+    def create(cls, path, seed, interval=DEFAULT_INTERVAL):
+        """Starts a new log file, with the seed of the game"""
+        file = open(path, 'wb')
+        file.write(HEADER.pack(MAGIC, VERSION, seed))
+        file.write(INTERVAL.pack(interval))
+        file.flush()
+        return cls(path, file, seed, interval, b'',
+                   [(0, 0, 0, file.tell())])
+
+    @classmethod
+    def resume(cls, path, records):
+        """
+        Reopens a log to carry on writing after its first records,
+        dropping anything written after that (e.g. moves made after
+        the game was saved) along with the index
+
+        Raises ValueError if the log has fewer records than that
+        (e.g. a move was undone after the game was saved)
+        """
+        seed, interval, data, snapshots = read_log(path)
+        if records > len(data):
+            raise ValueError('{} has {} records, not {}'.format(
+                path, len(data), records))
+
+        log = cls(path, open(path, 'r+b'), seed, interval, data, snapshots)
+        log.truncate(records)
+        return log
+
+    def write(self, record):
+        """Appends one record byte, and a snapshot after every K records"""
+        self.file.write(bytes((record,)))
+        self.data.append(record)
+        self.board, self.score = apply_records(
+            self.board, self.score, (record,))
+
+        if self.interval and self.records % self.interval == 0:
+            self.file.write(SNAPSHOT.pack(
+                SNAPSHOT_MARKER, self.board, self.score))
+            self.snapshots.append(
+                (self.records, self.board, self.score, self.file.tell()))
+
+        self.file.flush()
+
+    def place(self, i, j, value):
+        """Logs a starting tile"""
+        self.write(encode_record(None, i, j, value))
+
+    def place_all(self, matrix):
+        """Logs every tile of a starting board as a placement"""
+        for i, row in enumerate(matrix):
+            for j, value in enumerate(row):
+                if value:
+                    self.place(i, j, value)
+
+    def record(self, direction, spawn):
+        """Logs a move, and the (row, column, value) tile spawned after it"""
+        i, j, value = spawn
+        self.write(encode_record(direction, i, j, value))
+
+    def has_moves(self):
+        """Returns True if any move was logged (not just starting tiles)"""
+        return any(not record & PLACEMENT for record in self.data)
+
+    def can_undo(self):
+        """Returns True if the last record is a move (not a starting tile)"""
+        return self.records > 0 and \
+            decode_record(self.data[-1])[0] is not None
+
+    def undo(self):
+        """Takes back the last move, returning the (bitboard, score) before"""
+        self.truncate(self.records - 1)
+        return self.board, self.score
+
+    def truncate(self, n):
+        """
+        Cuts the history back to its first n records,
+        replaying at most K records from the snapshot before
+        (the file is never made longer)
+        """
+        n = min(n, self.records)
+        while self.snapshots[-1][0] > n:
+            self.snapshots.pop()
+
+        number, board, score, offset = self.snapshots[-1]
+        self.board, self.score = apply_records(
+            board, score, self.data[number:n])
+        del self.data[n:]
+
+        end = offset + n - number
+        self.file.truncate(end)
+        self.file.seek(end)
+        self.file.flush()
+
+    def close(self):
+        """Writes the snapshot index and closes the file"""
+        if self.file.closed:
+            return
+
+        if self.interval:
+            for number, board, score, offset in self.snapshots[1:]:
+                self.file.write(
+                    INDEX_ENTRY.pack(number, offset - SNAPSHOT.size))
+            self.file.write(TRAILER.pack(
+                len(self.snapshots) - 1, TRAILER_MAGIC))
+
+        self.file.close()
+
+
+class Replay:
+    """
+    Reads a game history back, rebuilding the board at any point
+
+    Boards are rebuilt with bitboard moves (table lookups), starting from
+    the nearest snapshot - or the last position shown, when stepping
+    forwards - so seeking costs at most K moves.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.seed, self.interval, self.records, self.snapshots = \
+            read_log(path)
+        self.snapshot_numbers = [snapshot[0] for snapshot in self.snapshots]
+
+        # The most recently rebuilt position: (records applied, board, score)
+        self.position = (0, 0, 0)
+
+    def __len__(self):
+        return len(self.records)
+
+    def board_at(self, n):
+        """
+        Returns (bitboard, score) after the first n records
+        (see bitboard.to_matrix to turn the board into a matrix)
+        """
+        if not 0 <= n <= len(self.records):
+            raise IndexError('Record {} is out of range'.format(n))
+
+        # Start from the last snapshot at or before n,
+        # or the last position if that is closer
+        k = bisect.bisect_right(self.snapshot_numbers, n) - 1
+        applied, board, score, offset = self.snapshots[k]
+        if applied < self.position[0] <= n:
+            applied, board, score = self.position
+
+        board, score = apply_records(
+            board, score, self.records[applied:n])
+
+        self.position = (n, board, score)
+        return board, score
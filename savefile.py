@@ -0,0 +1,448 @@
+"""
+Saved game files.
+
+A save is a small JSON object:
+    {"version": 2, "game": {...}, "checksum": CRC-32 of the game}
+
+The game holds the board as tile exponents (0 = empty, 1 = 2, 2 = 4 ...),
+the score, the player's name and prediction, the spawn generator's seed
+and state, and where the game's move log is.
+
+Saves are written atomically: to a temporary file in the same folder,
+fsynced, then renamed over the old save, so the file on disk is always
+a whole save - the old one or the new one. A save which is cut short or
+changed is caught by its checksum when loaded.
+
+Saves from before the version field (raw tile values, no checksum)
+can still be loaded.
+
+AutoSaver writes saves on a background thread, so the game never waits
+on the disk. SaveSlots keeps many saves in one folder, with a small index
+of them, so listing the saves never reads the saves themselves.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+
+
+SAVE_VERSION = 2
+
+# Keys every saved game has (newer saves also have the spawn generator's
+# seed and state, and the move log's path and length)
+GAME_KEYS = ('game_matrix', 'score', 'name', 'predicted_score')
+
+
+class SaveError(Exception):
+    """Raised when a save file is damaged, or from a newer version"""
+
+
+def encode_matrix(matrix):
+    """
+    Tile values ==> tile exponents
+    e.g. [[0, 2, 4, 1024] ...] ==> [[0, 1, 2, 10] ...]
+    """
+    return [[int(value).bit_length() - 1 if value else 0 for value in row]
+            for row in matrix]
+
+
+def decode_matrix(exponents):
+    """Tile exponents ==> tile values (see encode_matrix)"""
+    return [[1 << exponent if exponent else 0 for exponent in row]
+            for row in exponents]
+
+
+def checksum(game):
+    """Returns the CRC-32 of a game dict, in a canonical JSON form"""
+    text = json.dumps(game, sort_keys=True, separators=(',', ':'))
+    return zlib.crc32(text.encode('utf-8'))
+
+
+def has_save(path):
+    """Returns True if there is a (non empty) save file, without reading it"""
+    try:
+        return os.path.getsize(path) > 0
+    except OSError:
+        return False
+
+
+def write_save(path, game):
+    """
+    Saves a game dict (with game_matrix as tile values), atomically
+
+    e.g. write_save('2048save.json', {'game_matrix': ..., 'score': 16, ...})
+    """
+    # The save counts the records of the game's move log, so make sure
+    # they are on disk before the save is
+    if 'log_path' in game:
+        sync_file(game['log_path'])
+
+    game = dict(game, game_matrix=encode_matrix(game['game_matrix']))
+    data = json.dumps({
+        'version': SAVE_VERSION,
+        'game': game,
+        'checksum': checksum(game)
+    }, separators=(',', ':'))
+
+    write_atomically(path, data)
+
+
+def sync_file(path):
+    """Flushes a file's data to disk (if the file is there)"""
+    try:
+        with open(path, 'r+b') as f:
+            os.fsync(f.fileno())
+    except OSError:
+        pass
+
+
+def write_atomically(path, text):
+    """Writes text to a temporary file, fsyncs it, and renames it to path"""
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(temporary_path, path)
+
+
+def read_save(path):
+    """
+    Loads a save, returning the game dict (with game_matrix as tile values),
+    or None if there is no save
+
+    Raises SaveError if the save is damaged, or from a newer version
+    """
+    if not has_save(path):
+        return None
+
+    with open(path, 'r') as f:
+        try:
+            data = json.load(f)
+        except ValueError:
+            raise SaveError('{} is damaged'.format(path))
+
+    if not isinstance(data, dict):
+        raise SaveError('{} is damaged'.format(path))
+
+    # Saves from before the version field hold the game itself
+    if 'version' not in data:
+        check_game(path, data)
+        return data
+
+    if not isinstance(data['version'], int):
+        raise SaveError('{} is damaged'.format(path))
+    if data['version'] > SAVE_VERSION:
+        raise SaveError('{} is from a newer version (format {})'.format(
+            path, data['version']))
+
+    game = data.get('game')
+    if not isinstance(game, dict) or checksum(game) != data.get('checksum'):
+        raise SaveError('{} is damaged'.format(path))
+
+    check_game(path, game)
+    game['game_matrix'] = decode_matrix(game['game_matrix'])
+    return game
+
+
+def check_game(path, game):
+    """Raises SaveError unless game is a dict with everything a game needs"""
+    if not isinstance(game, dict) or \
+            any(key not in game for key in GAME_KEYS):
+        raise SaveError('{} is damaged'.format(path))
+
+    matrix = game['game_matrix']
+    if not isinstance(matrix, list) or len(matrix) != 4 or \
+            any(not isinstance(row, list) or len(row) != 4 or
+                any(not isinstance(value, int) for value in row)
+                for row in matrix):
+        raise SaveError('{} is damaged'.format(path))
+
+
+def clear_save(path):
+    """Deletes the save file, if there is one"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# Pending change of a save file which deletes it (see AutoSaver.clear)
+CLEAR = object()
+
+
+class AutoSaver:
+    """
+    Writes saves on a background thread, coalescing them
+
+    The game hands over its state after every move (update). Only the
+    latest state of each save file is kept, and it is written once
+    enough moves have been made, or enough time has passed since the
+    first unsaved move. save() and clear() are written straight away.
+    """
+
+    def __init__(self, every_moves=10, every_seconds=30.0, on_write=None):
+        self.every_moves = every_moves
+        self.every_seconds = every_seconds
+
+        # Called on the writer thread as on_write(path, state or CLEAR)
+        # after each save is written or cleared (see SaveSlots.record)
+        self.on_write = on_write
+
+        # {save path: latest game state, or CLEAR}, waiting to be written
+        self.condition = threading.Condition()
+        self.pending = {}
+        self.moves = 0
+        self.dirty_since = None
+        self.urgent = False
+        self.writing = False
+        self.stopping = False
+
+        # The last error writing a save, if any (cleared by the next save
+        # written); errors are also reported on stderr as they happen
+        self.error = None
+
+        # A daemon, so the program can always exit; close() waits for it
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def update(self, path, state):
+        """Marks the save dirty after a move, with the game's latest state"""
+        with self.condition:
+            self.pending[path] = state
+            self.moves += 1
+            # The first unsaved move starts the writer's timer
+            if self.dirty_since is None:
+                self.dirty_since = time.monotonic()
+                self.condition.notify()
+            if self.moves >= self.every_moves:
+                self.condition.notify()
+
+    def save(self, path, state):
+        """Writes the game's state as soon as possible (e.g. Save button)"""
+        with self.condition:
+            self.pending[path] = state
+            self.urgent = True
+            self.condition.notify()
+
+    def clear(self, path):
+        """Deletes the save as soon as possible (e.g. game over)"""
+        with self.condition:
+            self.pending[path] = CLEAR
+            self.urgent = True
+            self.condition.notify()
+
+    def hurry(self):
+        """Writes the pending saves as soon as possible, without waiting"""
+        with self.condition:
+            if self.pending:
+                self.urgent = True
+                self.condition.notify()
+
+    def pending_states(self):
+        """
+        Returns a copy of the saves waiting to be written, as
+        {save path: game state, or CLEAR if the save is to be deleted}
+        """
+        with self.condition:
+            return dict(self.pending)
+
+    def flush(self, timeout=None):
+        """
+        Waits until every pending save is written (e.g. before loading),
+        or timeout seconds have passed.
+
+        Returns True if nothing is left to write
+        """
+        with self.condition:
+            self.urgent = True
+            self.condition.notify()
+            return self.condition.wait_for(
+                lambda: not (self.pending or self.writing), timeout)
+
+    def close(self):
+        """Writes what is pending, then stops the writer thread"""
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+
+        self.thread.join()
+
+    def is_due(self):
+        """Returns True if the pending saves should be written now"""
+        if not self.pending:
+            return False
+
+        return self.urgent or self.stopping or \
+            self.moves >= self.every_moves or \
+            time.monotonic() - self.dirty_since >= self.every_seconds
+
+    def run(self):
+        """The writer thread: waits until saves are due, then writes them"""
+        while True:
+            with self.condition:
+                while not self.is_due():
+                    if self.stopping:
+                        return
+
+                    # Wake up when the oldest unsaved move is due
+                    timeout = None
+                    if self.pending and self.dirty_since is not None:
+                        timeout = max(0, self.dirty_since +
+                                      self.every_seconds - time.monotonic())
+                    self.condition.wait(timeout)
+
+                pending = self.pending
+                self.pending = {}
+                self.moves = 0
+                self.dirty_since = None
+                self.urgent = False
+                self.writing = True
+
+            # Write outside the lock, so moves are never held up
+            # (any error is kept, so one bad save never stops the thread)
+            try:
+                for path, state in pending.items():
+                    try:
+                        if state is CLEAR:
+                            clear_save(path)
+                        else:
+                            write_save(path, state)
+                        if self.on_write is not None:
+                            self.on_write(path, state)
+                    except Exception as error:
+                        self.error = error
+                        print('Could not write {}: {}'.format(path, error),
+                              file=sys.stderr)
+                    else:
+                        self.error = None
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
+
+
+class SaveSlots:
+    """
+    This class is a folder of saved games, one file per slot,
+    with an index of the slots:
+
+        saves/index.json    [{"id", "name", "score", "max_tile",
+                              "timestamp", "board"}, ...]
+        saves/slot-1.json   one save (see write_save)
+
+    The board in the index is a 16 character thumbnail - one hex digit
+    per cell, the tile's exponent (capped at f) - so the slot list can be
+    drawn without opening any save. The index is read once, then kept in
+    memory; it is rewritten (atomically) by record(), on the autosave
+    thread, whenever a slot is written or cleared.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_path = os.path.join(directory, 'index.json')
+
+        # {slot id: index entry}, read on first use
+        self.lock = threading.Lock()
+        self.entries = None
+        self.next_id = None
+
+    def load_index(self):
+        """Reads the index, if it has not been read yet"""
+        with self.lock:
+            if self.entries is not None:
+                return
+
+            try:
+                with open(self.index_path, 'r') as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                entries = []
+
+            self.entries = {entry['id']: entry for entry in entries}
+            self.next_id = max(self.entries, default=0) + 1
+
+    def slots(self):
+        """Returns the index entries, most recently saved first"""
+        self.load_index()
+        with self.lock:
+            entries = list(self.entries.values())
+
+        entries.sort(key=lambda entry: entry['timestamp'], reverse=True)
+        return entries
+
+    def slot_path(self, slot_id):
+        """Returns the save file of a slot"""
+        return os.path.join(self.directory, 'slot-{}.json'.format(slot_id))
+
+    def new_slot_id(self):
+        """Returns an unused slot id, for a new game"""
+        self.load_index()
+        with self.lock:
+            slot_id = self.next_id
+            self.next_id += 1
+
+        return slot_id
+
+    def forget(self, slot_id):
+        """Drops a slot from the in-memory index (e.g. as it is deleted)"""
+        self.load_index()
+        with self.lock:
+            self.entries.pop(slot_id, None)
+
+    def record(self, path, state):
+        """
+        Updates the index after path was written with state,
+        or cleared (state is CLEAR). Paths outside the folder are ignored
+        """
+        name = os.path.basename(path)
+        if os.path.dirname(path) != self.directory or \
+                not (name.startswith('slot-') and name.endswith('.json')):
+            return
+
+        slot_id = int(name[len('slot-'):-len('.json')])
+        self.load_index()
+        with self.lock:
+            if state is CLEAR:
+                self.entries.pop(slot_id, None)
+            else:
+                exponents = encode_matrix(state['game_matrix'])
+                self.entries[slot_id] = {
+                    'id': slot_id,
+                    'name': state['name'],
+                    'score': int(state['score']),
+                    'max_tile': max(max(row) for row in state['game_matrix']),
+                    'timestamp': time.time(),
+                    'board': ''.join(
+                        '{:x}'.format(min(exponent, 15))
+                        for row in exponents for exponent in row)
+                }
+
+            text = json.dumps(
+                list(self.entries.values()), separators=(',', ':'))
+
+        os.makedirs(self.directory, exist_ok=True)
+        write_atomically(self.index_path, text)
+
+    def import_save(self, path):
+        """
+        Moves an old single save file (e.g. 2048save.json) into a new slot.
+        Returns the slot id, or None if there was nothing to move
+        """
+        try:
+            state = read_save(path)
+        except SaveError:
+            return None
+        if state is None:
+            return None
+
+        os.makedirs(self.directory, exist_ok=True)
+        slot_id = self.new_slot_id()
+        slot_path = self.slot_path(slot_id)
+        write_save(slot_path, state)
+        self.record(slot_path, state)
+        clear_save(path)
+        return slot_id
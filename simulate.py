@@ -0,0 +1,232 @@
+"""
+Batch self-play simulator for comparing move policies without the GUI.
+
+Plays N games in lockstep as one (N, 4, 4) NumPy array of tile exponents
+(0 = empty, 1 = 2, 2 = 4 ...). Every step applies the chosen move, merges,
+score and a random spawn to all unfinished games at once, using the row
+tables from bitboard.py.
+
+Usage:
+    python simulate.py --games 10000 --policy corner --seed 1
+"""
+import argparse
+import time
+
+import numpy as np
+
+import bitboard
+from game_engine import DIRECTIONS
+
+
+# Row move tables from bitboard.py, as NumPy arrays for fancy indexing
+_row_left, _row_right, _row_score, _row_legal = bitboard.load_tables()
+ROW_LEFT = np.array(_row_left, dtype=np.uint16)
+ROW_RIGHT = np.array(_row_right, dtype=np.uint16)
+ROW_SCORE = np.array(_row_score, dtype=np.int64)
+
+# Bit offset of each cell within a 16-bit row
+NIBBLE_SHIFTS = np.array([0, 4, 8, 12], dtype=np.uint16)
+
+# Spawn probabilities, as in GameEngine.add_two
+P_FOUR = 0.25
+
+
+def pack_rows(boards):
+    """(N, 4, 4) exponents ==> (N, 4) 16-bit row codes"""
+    return (boards.astype(np.uint16) << NIBBLE_SHIFTS).sum(
+        axis=2, dtype=np.uint16)
+
+
+def unpack_rows(rows):
+    """(N, 4) 16-bit row codes ==> (N, 4, 4) exponents"""
+    return ((rows[..., np.newaxis] >> NIBBLE_SHIFTS) & 0xF).astype(np.uint8)
+
+
+def all_moves(boards):
+    """
+    Applies every direction to every board.
+
+    Returns (moved, gained, legal):
+        moved:  (4, N, 4, 4) boards after each direction in DIRECTIONS
+        gained: (4, N) score gained by each direction
+        legal:  (N, 4) True where the direction changes the board
+    """
+    rows = pack_rows(boards)
+    columns = pack_rows(boards.transpose(0, 2, 1))
+
+    left = ROW_LEFT[rows]
+    right = ROW_RIGHT[rows]
+    up = ROW_LEFT[columns]
+    down = ROW_RIGHT[columns]
+
+    moved = np.stack([
+        unpack_rows(left),
+        unpack_rows(up).transpose(0, 2, 1),
+        unpack_rows(right),
+        unpack_rows(down).transpose(0, 2, 1)
+    ])
+
+    # Score gained is the same sliding either way along a line
+    row_score = ROW_SCORE[rows].sum(axis=1)
+    column_score = ROW_SCORE[columns].sum(axis=1)
+    gained = np.stack([row_score, column_score, row_score, column_score])
+
+    legal = (moved != boards[np.newaxis]).any(axis=(2, 3)).T
+    return moved, gained, legal
+
+
+def spawn(boards, rng):
+    """Adds a 2 (P = 0.75) or 4 (P = 0.25) to a random empty cell of each"""
+    cells = boards.reshape(len(boards), 16)
+
+    # The empty cell with the largest random key is chosen uniformly
+    keys = rng.random(cells.shape) * (cells == 0)
+    chosen = keys.argmax(axis=1)
+    exponents = np.where(rng.random(len(boards)) < P_FOUR, 2, 1)
+    cells[np.arange(len(boards)), chosen] = exponents
+
+
+def policy_random(boards, gained, legal, rng):
+    """Any legal move, uniformly"""
+    keys = rng.random(legal.shape) * legal
+    return keys.argmax(axis=1)
+
+
+def _priority(order):
+    """Builds a policy which plays the first legal move in order"""
+    order = np.array([DIRECTIONS.index(direction) for direction in order])
+
+    def policy(boards, gained, legal, rng):
+        return order[legal[:, order].argmax(axis=1)]
+
+    policy.__doc__ = 'First legal move of: ' + ', '.join(
+        DIRECTIONS[index] for index in order)
+    return policy
+
+
+def policy_greedy(boards, gained, legal, rng):
+    """The legal move which scores the most, ties broken at random"""
+    keys = np.where(legal, gained.T + rng.random(legal.shape), -1.0)
+    return keys.argmax(axis=1)
+
+
+POLICIES = {
+    'random': policy_random,
+    'cycle': _priority(('right', 'down', 'left', 'up')),
+    'corner': _priority(('down', 'left', 'right', 'up')),
+    'greedy': policy_greedy
+}
+
+
+def simulate(games, policy='corner', seed=None, max_moves=100000):
+    """
+    Plays games in lockstep with the named policy.
+
+    Returns a dict of NumPy arrays (one entry per game):
+        score, max_tile, moves
+    and the total number of moves played under 'total_moves'
+    """
+    choose = POLICIES[policy]
+    rng = np.random.default_rng(seed)
+
+    # Every game starts with two spawned tiles
+    boards = np.zeros((games, 4, 4), dtype=np.uint8)
+    spawn(boards, rng)
+    spawn(boards, rng)
+
+    scores = np.zeros(games, dtype=np.int64)
+    moves = np.zeros(games, dtype=np.int64)
+    active = np.arange(games)
+
+    for _ in range(max_moves):
+        if len(active) == 0:
+            break
+
+        current = boards[active]
+        moved, gained, legal = all_moves(current)
+
+        # Games with no legal move are finished
+        playing = legal.any(axis=1)
+        active = active[playing]
+        current = current[playing]
+        moved = moved[:, playing]
+        gained = gained[:, playing]
+        legal = legal[playing]
+        if len(active) == 0:
+            break
+
+        # Apply each game's chosen move, then spawn
+        direction = choose(current, gained, legal, rng)
+        index = np.arange(len(active))
+        current = moved[direction, index]
+        spawn(current, rng)
+
+        boards[active] = current
+        scores[active] += gained[direction, index]
+        moves[active] += 1
+
+    return {
+        'score': scores,
+        'max_tile': 1 << boards.reshape(games, 16).max(axis=1).astype(
+            np.int64),
+        'moves': moves,
+        'total_moves': int(moves.sum())
+    }
+
+
+def print_summary(results, elapsed):
+    """Prints the score distribution, max tile histogram and moves / s"""
+    scores = results['score']
+    games = len(scores)
+
+    print('Games: {}'.format(games))
+    print('Moves: {} ({:.0f} moves / s)'.format(
+        results['total_moves'], results['total_moves'] / max(elapsed, 1e-9)))
+    print('Time: {:.2f} s'.format(elapsed))
+
+    print('\nScore')
+    print('  mean {:.0f}, std {:.0f}, min {}, max {}'.format(
+        scores.mean(), scores.std(), scores.min(), scores.max()))
+    percentiles = (10, 25, 50, 75, 90, 99)
+    print('  ' + ', '.join(
+        'p{} {:.0f}'.format(p, value)
+        for p, value in zip(percentiles, np.percentile(scores, percentiles))))
+
+    print('\nMax tile')
+    tiles, counts = np.unique(results['max_tile'], return_counts=True)
+    for tile, count in zip(tiles, counts):
+        print('  {:>6}: {:>7} ({:5.1f}%)'.format(
+            tile, count, 100 * count / games))
+
+
+def positive_int(text):
+    """argparse type for counts which must be at least 1"""
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(
+            'must be a positive integer, not {}'.format(text))
+
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Play many games of 2048 at once, without the GUI')
+    parser.add_argument(
+        '-n', '--games', type=positive_int, default=1000,
+        help='number of games to play (default: 1000)')
+    parser.add_argument(
+        '-p', '--policy', choices=sorted(POLICIES), default='corner',
+        help='move policy (default: corner)')
+    parser.add_argument(
+        '-s', '--seed', type=int, default=None,
+        help='random seed, for repeatable runs')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = simulate(args.games, args.policy, args.seed)
+    print_summary(results, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
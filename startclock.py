@@ -0,0 +1,11 @@
+"""
+Records when the program started, for timing startup
+(see MainProgram.mark_startup).
+
+main.pyw imports this module first, so the time taken by every other
+import is counted.
+"""
+import time
+
+
+START = time.perf_counter()